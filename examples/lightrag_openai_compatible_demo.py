@@ -1,21 +1,60 @@
 import os
 import asyncio
+import contextlib
+import dataclasses
+import hashlib
 import inspect
 import logging
-import logging.config
+import math
+import logging.handlers
+import queue
+import sys
+import numpy as np
+import aiofiles
+import aiohttp
+
+# requires `pip install "openai[aiohttp]"`
+from openai import AsyncOpenAI, DefaultAioHttpClient
+from httpx_aiohttp import AiohttpTransport
 from lightrag import LightRAG, QueryParam
-from lightrag.llm.openai import openai_complete_if_cache
+from lightrag.llm.openai import openai_complete_if_cache, create_openai_async_client
 from lightrag.llm.ollama import ollama_embed
 from lightrag.utils import EmbeddingFunc, logger, set_verbose_debug
 from lightrag.kg.shared_storage import initialize_pipeline_status
 from lightrag.llm.openai import openai_embed
 from lightrag.rerank import custom_rerank
 
+# rerank_cache.py sits next to this script; import it from any working directory
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from rerank_cache import TTLCache, SemanticCache, cosine_top_n
+
 from dotenv import load_dotenv
 
 load_dotenv(dotenv_path=".env", override=False) # 从.env文件中获取配置
 WORKING_DIR = "./dickens"
 
+QUERY_MODES = ("naive", "local", "global", "hybrid")
+# Per-mode query templates; LightRAG mutates the param it is given (original_query,
+# and mode fallbacks in kg_query), so each call gets a dataclasses.replace copy
+QUERY_PARAMS = {mode: QueryParam(mode=mode, stream=False) for mode in QUERY_MODES}
+
+# Resolve model settings once instead of on every LLM/embedding/rerank call
+LLM_MODEL = os.getenv("LLM_MODEL", "deepseek-chat")
+# 提供备选方案
+LLM_BINDING_API_KEY = os.getenv("LLM_BINDING_API_KEY") or os.getenv("OPENAI_API_KEY")
+LLM_BINDING_HOST = os.getenv("LLM_BINDING_HOST", "https://api.deepseek.com")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "bge-reranker-v2-m3")
+RERANK_BINDING_HOST = os.getenv("RERANK_BINDING_HOST", "###########")
+RERANK_BINDING_API_KEY = os.getenv("RERANK_BINDING_API_KEY", "123456")
+EMBEDDING_BINDING_HOST = os.getenv("EMBEDDING_BINDING_HOST", "###########")
+EMBEDDING_BINDING_API_KEY = os.getenv("EMBEDDING_BINDING_API_KEY", "123456")
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "1024"))
+MAX_EMBED_TOKENS = int(os.getenv("MAX_EMBED_TOKENS", "8192"))
+
+
+# Background listener that owns the log file handler, started by configure_logging()
+log_listener: logging.handlers.QueueListener | None = None
+
 
 def configure_logging():
     """Configure logging for the application"""
@@ -40,43 +79,35 @@ def configure_logging():
     log_max_bytes = int(os.getenv("LOG_MAX_BYTES", 10485760))  # Default 10MB
     log_backup_count = int(os.getenv("LOG_BACKUP_COUNT", 5))  # Default 5 backups
 
-    logging.config.dictConfig(
-        {
-            "version": 1,
-            "disable_existing_loggers": False,
-            "formatters": {
-                "default": {
-                    "format": "%(levelname)s: %(message)s",
-                },
-                "detailed": {
-                    "format": "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-                },
-            },
-            "handlers": {
-                "console": {
-                    "formatter": "default",
-                    "class": "logging.StreamHandler",
-                    "stream": "ext://sys.stderr",
-                },
-                "file": {
-                    "formatter": "detailed",
-                    "class": "logging.handlers.RotatingFileHandler",
-                    "filename": log_file_path,
-                    "maxBytes": log_max_bytes,
-                    "backupCount": log_backup_count,
-                    "encoding": "utf-8",
-                },
-            },
-            "loggers": {
-                "lightrag": {
-                    "handlers": ["console", "file"],
-                    "level": "INFO",
-                    "propagate": False,
-                },
-            },
-        }
+    # Build handlers directly rather than through logging.config.dictConfig
+    default_formatter = logging.Formatter("%(levelname)s: %(message)s")
+    detailed_formatter = logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     )
 
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setFormatter(default_formatter)
+
+    # File writes happen on the QueueListener thread instead of the event loop
+    global log_listener
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_file_path,
+        maxBytes=log_max_bytes,
+        backupCount=log_backup_count,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(detailed_formatter)
+    log_queue = queue.Queue(-1)
+    log_listener = logging.handlers.QueueListener(log_queue, file_handler)
+    log_listener.start()
+
+    lightrag_logger = logging.getLogger("lightrag")
+    lightrag_logger.handlers[:] = [
+        console_handler,
+        logging.handlers.QueueHandler(log_queue),
+    ]
+    lightrag_logger.propagate = False
+
     # Set the logger level to INFO
     logger.setLevel(logging.INFO)
     # Enable verbose debug if needed
@@ -87,59 +118,263 @@ if not os.path.exists(WORKING_DIR):
     os.mkdir(WORKING_DIR)
 
 
+# Shared clients reused by every LLM / embedding call, closed at the end of main()
+llm_client: AsyncOpenAI | None = None
+embedding_client: AsyncOpenAI | None = None
+
+
+def create_aiohttp_openai_client(
+    api_key: str,
+    base_url: str,
+    limit: int,
+    limit_per_host: int,
+    keepalive_timeout: float,
+) -> AsyncOpenAI:
+    """Create an AsyncOpenAI client on an aiohttp transport with a pooled connector"""
+    http_client = DefaultAioHttpClient(
+        transport=AiohttpTransport(
+            # The session is created lazily inside the running event loop
+            client=lambda: aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=limit,
+                    limit_per_host=limit_per_host,
+                    keepalive_timeout=keepalive_timeout,
+                )
+            )
+        )
+    )
+    return create_openai_async_client(
+        api_key=api_key,
+        base_url=base_url,
+        client_configs={"http_client": http_client},
+    )
+
+
+def create_llm_client() -> AsyncOpenAI:
+    return create_aiohttp_openai_client(
+        LLM_BINDING_API_KEY,
+        LLM_BINDING_HOST,
+        limit=100,
+        limit_per_host=64,
+        keepalive_timeout=30,
+    )
+
+
+def create_embedding_client() -> AsyncOpenAI:
+    return create_aiohttp_openai_client(
+        EMBEDDING_BINDING_API_KEY,
+        EMBEDDING_BINDING_HOST,
+        limit=64,
+        limit_per_host=32,
+        keepalive_timeout=60,
+    )
+
+
 async def llm_model_func(
     prompt, system_prompt=None, history_messages=[], keyword_extraction=False, **kwargs
 ) -> str:
     # Ensure enable_thinking is set to False for non-streaming calls
     return await openai_complete_if_cache(
-        os.getenv("LLM_MODEL", "deepseek-chat"),
+        LLM_MODEL,
         prompt,
         system_prompt=system_prompt,
         history_messages=history_messages,
-        api_key=os.getenv("LLM_BINDING_API_KEY") or os.getenv("OPENAI_API_KEY"), # 提供备选方案
-        base_url=os.getenv("LLM_BINDING_HOST", "https://api.deepseek.com"),
+        api_key=LLM_BINDING_API_KEY,
+        base_url=LLM_BINDING_HOST,
+        openai_client=llm_client,
         **kwargs,
     )
 
+
+async def local_rerank_fallback(query: str, documents: list, top_n: int) -> list:
+    """Rank documents by embedding cosine similarity to the query"""
+    vectors = await embed([query] + [d.get("content", "") for d in documents])
+    indices, scores = cosine_top_n(vectors[0], vectors[1:], top_n)
+    return [
+        {**documents[i], "rerank_score": float(score)}
+        for i, score in zip(indices.tolist(), scores.tolist())
+    ]
+
+
 async def my_rerank_func(query: str, documents: list, top_n: int = None, **kwargs):
     """Custom rerank function with all settings included"""
-    return await custom_rerank(
+    reranked = await custom_rerank(
         query=query,
         documents=documents,
-        model=os.getenv("RERANK_MODEL", "bge-reranker-v2-m3"),
-        base_url=os.getenv("RERANK_BINDING_HOST", "###########"),
-        api_key=os.getenv("RERANK_BINDING_API_KEY", "123456"),
+        model=RERANK_MODEL,
+        base_url=RERANK_BINDING_HOST,
+        api_key=RERANK_BINDING_API_KEY,
         top_n=top_n or 10,
         **kwargs,
     )
+    # custom_rerank logs failures and hands back the input list unchanged
+    if reranked is documents and documents:
+        logger.warning("Remote rerank unavailable, falling back to local cosine rerank")
+        return await local_rerank_fallback(query, documents, top_n or 10)
+    return reranked
+
+
+# Exact and semantic caches in front of the remote reranker
+exact_rerank_cache = TTLCache(max_items=4096, ttl_sec=30)
+semantic_rerank_cache = SemanticCache(embedding_dim=EMBEDDING_DIM, threshold=0.95)
+# Document sets reranked recently; only these are worth a query embedding
+recent_rerank_scopes = TTLCache(max_items=4096, ttl_sec=30)
+
+
+def clear_rerank_cache():
+    """Drop cached rerank results, called whenever new documents are inserted"""
+    exact_rerank_cache.clear()
+    semantic_rerank_cache.clear()
+    recent_rerank_scopes.clear()
+
+
+def rerank_doc_key(doc: dict) -> str:
+    """Stable cache key for a document: its id, or a digest of its content"""
+    doc_id = doc.get("chunk_id") or doc.get("id")
+    if doc_id:
+        return doc_id
+    return hashlib.blake2b(
+        doc.get("content", "").encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+async def cached_rerank_func(query: str, documents: list, top_n: int = None, **kwargs):
+    """my_rerank_func with exact and semantic result caching"""
+    # Content digests instead of hash(): str hashes are salted per process, which
+    # would break the keys if the cache were ever shared or persisted
+    doc_ids = tuple(rerank_doc_key(d) for d in documents)
+    scope = (doc_ids, top_n)
+    key = (query, scope)
+
+    cached = exact_rerank_cache.get(key)
+    if cached is not None:
+        return cached
+
+    # The query embedding is a round trip of its own, and the semantic layer can
+    # only hit for a document set that was reranked before, so skip it otherwise
+    query_vec = None
+    if recent_rerank_scopes.get(scope):
+        query_vec = (await embed([query]))[0]
+        cached = semantic_rerank_cache.get(scope, query_vec)
+        if cached is not None:
+            exact_rerank_cache.set(key, cached)
+            return cached
+
+    result = await my_rerank_func(query, documents, top_n=top_n, **kwargs)
+    exact_rerank_cache.set(key, result)
+    recent_rerank_scopes.set(scope, True)
+    if query_vec is not None:
+        semantic_rerank_cache.set(scope, query_vec, result)
+    return result
+
+
+try:
+    from numba import float32, guvectorize
+
+    @guvectorize(
+        [(float32[:], float32[:])], "(n)->(n)", nopython=True, fastmath=True, cache=True
+    )
+    def l2_normalize(vector, out):
+        # Sum of squares and scaling fused into a single kernel per row
+        total = float32(0.0)
+        for i in range(vector.shape[0]):
+            total += vector[i] * vector[i]
+        inv = float32(1.0) / math.sqrt(total + float32(1e-12))
+        for i in range(vector.shape[0]):
+            out[i] = vector[i] * inv
+
+except ImportError:
+
+    def l2_normalize(vectors):
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.sqrt(norms * norms + 1e-12)
+
+
+EMBED_SUB_BATCH_SIZE = 256
+# Cap in-flight embedding requests to respect provider rate limits
+embed_semaphore = asyncio.Semaphore(32)
+
+
+async def embed_sub_batch(texts: list[str]) -> np.ndarray:
+    async with embed_semaphore:
+        return await openai_embed(
+            texts,
+            model="bge-m3",
+            base_url=EMBEDDING_BINDING_HOST,
+            api_key=EMBEDDING_BINDING_API_KEY,
+            openai_client=embedding_client,
+        )
+
 
+async def embed(texts: list[str]) -> np.ndarray:
+    """Split texts into sub-batches and embed them concurrently"""
+    if not texts:
+        return np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+    sub_batches = [
+        texts[i : i + EMBED_SUB_BATCH_SIZE]
+        for i in range(0, len(texts), EMBED_SUB_BATCH_SIZE)
+    ]
+    embeddings = await asyncio.gather(*[embed_sub_batch(b) for b in sub_batches])
+    # Unit-length rows let cosine similarity downstream reduce to a dot product
+    return l2_normalize(
+        np.concatenate(embeddings, axis=0).astype(np.float32, copy=False)
+    )
 
-async def print_stream(stream):
+
+BOOK_BLOCK_SIZE = 200 * 1024  # characters per read
+
+
+async def read_text_blocks(
+    file_path: str, block_size: int = BOOK_BLOCK_SIZE
+) -> list[str]:
+    """Read a text file without blocking the event loop, cut into blocks at paragraph boundaries"""
+    blocks = []
+    pending = ""
+    async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
+        while data := await f.read(block_size):
+            pending += data
+            cut = pending.rfind("\n\n")
+            if cut > 0:
+                blocks.append(pending[:cut])
+                pending = pending[cut + 2 :]
+    if pending.strip():
+        blocks.append(pending)
+    return blocks
+
+
+async def print_stream(stream, flush_every: int = 8):
+    # Batch chunks into one write/flush per line or every flush_every chunks
+    buffer = []
     async for chunk in stream:
         if chunk:
-            print(chunk, end="", flush=True)
+            buffer.append(chunk)
+            if len(buffer) >= flush_every or "\n" in chunk:
+                sys.stdout.write("".join(buffer))
+                sys.stdout.flush()
+                buffer.clear()
+    if buffer:
+        sys.stdout.write("".join(buffer))
+        sys.stdout.flush()
 
 
 async def initialize_rag():
+    global embedding_client
+    embedding_client = create_embedding_client()
+
     rag = LightRAG(
         working_dir=WORKING_DIR,
         llm_model_func=llm_model_func,
         embedding_func=EmbeddingFunc(
-            embedding_dim=int(os.getenv("EMBEDDING_DIM", "1024")),
-            max_token_size=int(os.getenv("MAX_EMBED_TOKENS", "8192")),
+            embedding_dim=EMBEDDING_DIM,
+            max_token_size=MAX_EMBED_TOKENS,
             # func=lambda texts: ollama_embed(
             #     texts,
             #     embed_model=os.getenv("EMBEDDING_MODEL", "bge-m3:latest"),
             #     host=os.getenv("EMBEDDING_BINDING_HOST", "http://localhost:11434"),
             # ),
-            func=lambda texts: openai_embed(
-                texts,
-                model="bge-m3",
-                base_url=os.getenv("EMBEDDING_BINDING_HOST", "###########"),
-                api_key=os.getenv("EMBEDDING_BINDING_API_KEY", "123456") 
-            ),
+            func=embed,
         ),
-        rerank_model_func=my_rerank_func,
+        rerank_model_func=cached_rerank_func,
     )
 
     await rag.initialize_storages()
@@ -148,102 +383,115 @@ async def initialize_rag():
     return rag
 
 
-async def main():
+@contextlib.asynccontextmanager
+async def rag_context():
+    """Yield an initialized LightRAG instance and always finalize its storages"""
+    rag = await initialize_rag()
     try:
-        # Clear old data files
-        files_to_delete = [
-            "graph_chunk_entity_relation.graphml",
-            "kv_store_doc_status.json",
-            "kv_store_full_docs.json",
-            "kv_store_text_chunks.json",
-            "vdb_chunks.json",
-            "vdb_entities.json",
-            "vdb_relationships.json",
-        ]
-
-        for file in files_to_delete:
-            file_path = os.path.join(WORKING_DIR, file)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"Deleting old file:: {file_path}")
-
-        # Initialize RAG instance
-        rag = await initialize_rag()
-
-        # Test embedding function
-        test_text = ["This is a test string for embedding."]
-        embedding = await rag.embedding_func(test_text)
-        embedding_dim = embedding.shape[1]
-        print("\n=======================")
-        print("Test embedding function")
-        print("========================")
-        print(f"Test dict: {test_text}")
-        print(f"Detected embedding dimension: {embedding_dim}\n\n")
-
-        with open("./testfiles/book.txt", "r", encoding="utf-8") as f:
-            await rag.ainsert(f.read())
-
-        # Perform naive search
-        print("\n=====================")
-        print("Query mode: naive") # naive模式直接调用LLM生成回答，不进行任何检索
-        print("=====================")
-        resp = await rag.aquery(
-            "What are the top themes in this story?",
-            param=QueryParam(mode="naive", stream=True),
-        )
-        if inspect.isasyncgen(resp):
-            await print_stream(resp)
-        else:
-            print(resp)
-
-        # Perform local search
-        print("\n=====================")
-        print("Query mode: local") # local模式使用本地存储的文档进行检索
-        print("=====================")
-        resp = await rag.aquery(
-            "What are the top themes in this story?",
-            param=QueryParam(mode="local", stream=True),
-        )
-        if inspect.isasyncgen(resp):
-            await print_stream(resp)
-        else:
-            print(resp)
-
-        # Perform global search
-        print("\n=====================")
-        print("Query mode: global") # global模式使用知识图谱进行检索
-        print("=====================")
-        resp = await rag.aquery(
-            "What are the top themes in this story?",
-            param=QueryParam(mode="global", stream=True),
-        )
-        if inspect.isasyncgen(resp):
-            await print_stream(resp)
-        else:
-            print(resp)
-
-        # Perform hybrid search
-        print("\n=====================")
-        print("Query mode: hybrid") # hybrid模式同时使用本地存储的文档和知识图谱进行检索
-        print("=====================")
-        resp = await rag.aquery(
-            "What are the top themes in this story?",
-            param=QueryParam(mode="hybrid", stream=True),
-        )
-        if inspect.isasyncgen(resp):
-            await print_stream(resp)
-        else:
-            print(resp)
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
+        yield rag
     finally:
-        if rag:
-            await rag.finalize_storages()
+        await rag.finalize_storages()
+
+
+async def close_openai_clients():
+    clients = [c for c in (llm_client, embedding_client) if c is not None]
+    await asyncio.gather(*(client.close() for client in clients))
+
+
+def safe_unlink(file_path: str):
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(file_path)
+        print(f"Deleting old file:: {file_path}")
+
+
+async def main():
+    global llm_client
+    # Teardown runs in reverse registration order: finalize storages,
+    # then close the HTTP clients concurrently, then stop the log listener
+    async with contextlib.AsyncExitStack() as stack:
+        if log_listener:
+            stack.callback(log_listener.stop)
+        stack.push_async_callback(close_openai_clients)
+        try:
+            llm_client = create_llm_client()
+
+            # Clear old data files
+            files_to_delete = [
+                "graph_chunk_entity_relation.graphml",
+                "kv_store_doc_status.json",
+                "kv_store_full_docs.json",
+                "kv_store_text_chunks.json",
+                "vdb_chunks.json",
+                "vdb_entities.json",
+                "vdb_relationships.json",
+            ]
+
+            # Unlink concurrently in worker threads without a separate exists check
+            paths = [os.path.join(WORKING_DIR, file) for file in files_to_delete]
+            await asyncio.gather(*[asyncio.to_thread(safe_unlink, p) for p in paths])
+
+            # Initialize RAG instance
+            rag = await stack.enter_async_context(rag_context())
+
+            # Only call the embedding service when verification is requested;
+            # otherwise report the configured dimension without a network round-trip
+            if os.getenv("VERIFY_EMBED") == "1":
+                test_text = ["This is a test string for embedding."]
+                embedding = await rag.embedding_func(test_text)
+                embedding_dim = embedding.shape[1]
+                print("\n=======================")
+                print("Test embedding function")
+                print("========================")
+                print(f"Test dict: {test_text}")
+            else:
+                embedding_dim = rag.embedding_func.embedding_dim
+            print(f"Detected embedding dimension: {embedding_dim}\n\n")
+
+            # Each block becomes its own document so the pipeline can process them in parallel
+            book_blocks = await read_text_blocks("./testfiles/book.txt")
+            await rag.ainsert(book_blocks)
+            clear_rerank_cache()
+
+            # Run all query modes concurrently; streaming is disabled because
+            # interleaved async generators would garble stdout
+            query = "What are the top themes in this story?"
+            # naive模式直接调用LLM生成回答，不进行任何检索
+            # local模式使用本地存储的文档进行检索
+            # global模式使用知识图谱进行检索
+            # hybrid模式同时使用本地存储的文档和知识图谱进行检索
+
+            async def run_query(mode):
+                return mode, await rag.aquery(
+                    query, param=dataclasses.replace(QUERY_PARAMS[mode])
+                )
+
+            results = await asyncio.gather(*[run_query(mode) for mode in QUERY_MODES])
+
+            for mode, resp in results:
+                print("\n=====================")
+                print(f"Query mode: {mode}")
+                print("=====================")
+                if inspect.isasyncgen(resp):
+                    await print_stream(resp)
+                else:
+                    print(resp)
+
+        except Exception as e:
+            print(f"An error occurred: {e}")
 
 
 if __name__ == "__main__":
     # Configure logging before running the main function
     configure_logging()
-    asyncio.run(main())
+    # Prefer the libuv-based event loop when uvloop is installed
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        if sys.version_info >= (3, 11):
+            uvloop.run(main())
+        else:
+            uvloop.install()
+            asyncio.run(main())
     print("\nDone!")
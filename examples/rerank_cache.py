@@ -0,0 +1,256 @@
+"""
+Rerank helpers used by lightrag_openai_compatible_demo.py
+
+- TTLCache: exact-match LRU cache with per-entry expiry
+- SemanticCache: approximate cache keyed by query embedding. Queries are bucketed
+  with random-projection LSH, lookups also probe the buckets one sign bit away,
+  and a hit requires cosine similarity >= threshold against a cached query in a
+  probed bucket. Cached embeddings are stored as int8 codes with a per-vector
+  scale (SQ8), a quarter of the float32 footprint.
+- cosine_top_n: local cosine scoring used when the remote reranker is unavailable.
+  Compiled with numba when it is installed (`pip install numba`).
+"""
+
+import time
+from collections import OrderedDict
+from itertools import count
+from typing import Any, Hashable
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_scores(query_vec, doc_matrix):
+        # query_vec must be L2-normalized; doc norms are fused into the same pass
+        scores = np.empty(doc_matrix.shape[0], dtype=np.float32)
+        for i in prange(doc_matrix.shape[0]):
+            dot = 0.0
+            norm = 0.0
+            for k in range(query_vec.shape[0]):
+                dot += query_vec[k] * doc_matrix[i, k]
+                norm += doc_matrix[i, k] * doc_matrix[i, k]
+            scores[i] = dot / np.sqrt(norm) if norm > 0.0 else 0.0
+        return scores
+
+    @njit(fastmath=True, cache=True)
+    def _sq8_scores(query_codes, query_scale, codes, scales):
+        # int8 x int8 products accumulated in int32, rescaled once per row
+        scores = np.empty(codes.shape[0], dtype=np.float32)
+        for i in range(codes.shape[0]):
+            acc = np.int32(0)
+            for k in range(codes.shape[1]):
+                acc += np.int32(query_codes[k]) * np.int32(codes[i, k])
+            scores[i] = acc * query_scale * scales[i]
+        return scores
+
+    # Compile once at import; cache=True reuses the machine code across runs
+    _cosine_scores(np.ones(2, dtype=np.float32), np.ones((1, 2), dtype=np.float32))
+    _sq8_scores(
+        np.ones(2, dtype=np.int8),
+        np.float32(1.0),
+        np.ones((1, 2), dtype=np.int8),
+        np.ones(1, dtype=np.float32),
+    )
+
+else:
+
+    def _cosine_scores(query_vec, doc_matrix):
+        norms = np.linalg.norm(doc_matrix, axis=1)
+        norms[norms == 0] = 1.0
+        return (doc_matrix @ query_vec) / norms
+
+    def _sq8_scores(query_codes, query_scale, codes, scales):
+        dots = codes.astype(np.int32) @ query_codes.astype(np.int32)
+        return dots * (scales * query_scale)
+
+
+def copy_result(value: Any) -> Any:
+    """Shallow-copy a cached rerank result (a list of document dicts)
+
+    Callers may reorder, truncate or annotate the list they get back, which must
+    not change the cached entry.
+    """
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    return value
+
+
+def sq8_quantize(vector: np.ndarray) -> tuple[np.ndarray, np.float32]:
+    """Quantize a vector to int8 codes and the scale that maps codes back to floats"""
+    max_abs = float(np.max(np.abs(vector))) if vector.size else 0.0
+    if max_abs == 0.0:
+        return np.zeros(vector.shape, dtype=np.int8), np.float32(0.0)
+    codes = np.round(vector * (127.0 / max_abs)).astype(np.int8)
+    return codes, np.float32(max_abs / 127.0)
+
+
+def cosine_top_n(
+    query_vec: np.ndarray, doc_matrix: np.ndarray, n: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return (indices, scores) of the n documents most similar to the query, best first"""
+    query_vec = np.ascontiguousarray(query_vec, dtype=np.float32)
+    doc_matrix = np.ascontiguousarray(doc_matrix, dtype=np.float32)
+    norm = np.linalg.norm(query_vec)
+    if norm > 0:
+        query_vec = query_vec / norm
+
+    scores = _cosine_scores(query_vec, doc_matrix)
+    n = min(n, len(scores))
+    if n <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    top = np.argpartition(-scores, n - 1)[:n]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+class TTLCache:
+    """OrderedDict based LRU cache whose entries expire after ttl_sec seconds
+
+    Values are copied with copy_result on the way in and out.
+    """
+
+    def __init__(self, max_items: int = 4096, ttl_sec: float = 30):
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: Hashable) -> Any | None:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return copy_result(value)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl_sec, copy_result(value))
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SemanticCache:
+    """Approximate cache keyed by (scope, query embedding)
+
+    The scope must match exactly (e.g. the document ids being reranked), while the
+    query only needs to be close enough to a cached one. Cached embeddings are
+    bucketed by the sign pattern of a fixed random projection. A lookup scores the
+    candidates in the query's bucket and in the num_bits buckets one bit away, so
+    a near-duplicate query still hits when a single sign flips (about 80% of
+    queries at cosine 0.95 with 8 bits, against 18% for an exact 16-bit match).
+    Values are copied with copy_result on the way in and out.
+    """
+
+    def __init__(
+        self,
+        embedding_dim: int,
+        threshold: float = 0.95,
+        num_bits: int = 8,
+        max_items: int = 4096,
+        ttl_sec: float = 30,
+        seed: int = 0,
+    ):
+        self.threshold = threshold
+        self.max_items = max_items
+        self.ttl_sec = ttl_sec
+        rng = np.random.default_rng(seed)
+        self._projection = rng.standard_normal((embedding_dim, num_bits)).astype(
+            np.float32
+        )
+        self._bit_weights = 1 << np.arange(num_bits, dtype=np.int64)
+        self._probe_masks = [0] + [1 << bit for bit in range(num_bits)]
+        self._ids = count()
+        # entry_id -> (bucket_key, (int8 codes, scale) of normalized embedding, value, expires_at)
+        self._entries: OrderedDict[int, tuple] = OrderedDict()
+        self._buckets: dict[tuple, list[int]] = {}
+        self._scope_sizes: dict[Hashable, int] = {}
+
+    def _normalize(self, vector: np.ndarray) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _bucket_key(self, scope: Hashable, vector: np.ndarray) -> tuple:
+        bits = (vector @ self._projection) > 0
+        return scope, int(bits @ self._bit_weights)
+
+    def _remove(self, entry_id: int) -> None:
+        bucket_key = self._entries.pop(entry_id)[0]
+        bucket = self._buckets[bucket_key]
+        bucket.remove(entry_id)
+        if not bucket:
+            del self._buckets[bucket_key]
+        scope = bucket_key[0]
+        self._scope_sizes[scope] -= 1
+        if not self._scope_sizes[scope]:
+            del self._scope_sizes[scope]
+
+    def get(self, scope: Hashable, vector: np.ndarray) -> Any | None:
+        if scope not in self._scope_sizes:
+            return None
+        vector = self._normalize(vector)
+        code = self._bucket_key(scope, vector)[1]
+        entry_ids = []
+        for mask in self._probe_masks:
+            entry_ids.extend(self._buckets.get((scope, code ^ mask), ()))
+        if not entry_ids:
+            return None
+
+        now = time.monotonic()
+        expired = [i for i in entry_ids if self._entries[i][3] < now]
+        if expired:
+            for entry_id in expired:
+                self._remove(entry_id)
+            entry_ids = [i for i in entry_ids if i in self._entries]
+            if not entry_ids:
+                return None
+
+        codes = np.stack([self._entries[i][1][0] for i in entry_ids])
+        scales = np.array([self._entries[i][1][1] for i in entry_ids], dtype=np.float32)
+        query_codes, query_scale = sq8_quantize(vector)
+        scores = _sq8_scores(query_codes, query_scale, codes, scales)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        entry_id = entry_ids[best]
+        self._entries.move_to_end(entry_id)
+        return copy_result(self._entries[entry_id][2])
+
+    def set(self, scope: Hashable, vector: np.ndarray, value: Any) -> None:
+        vector = self._normalize(vector)
+        bucket_key = self._bucket_key(scope, vector)
+        entry_id = next(self._ids)
+        self._entries[entry_id] = (
+            bucket_key,
+            sq8_quantize(vector),
+            copy_result(value),
+            time.monotonic() + self.ttl_sec,
+        )
+        self._buckets.setdefault(bucket_key, []).append(entry_id)
+        self._scope_sizes[scope] = self._scope_sizes.get(scope, 0) + 1
+        while len(self._entries) > self.max_items:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._buckets.clear()
+        self._scope_sizes.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -301,6 +301,21 @@ class LightRAG:
     )
     """Minimum rerank score threshold for filtering chunks after reranking."""
 
+    skip_rerank_small: bool = field(
+        default=get_env_value("SKIP_RERANK_SMALL", False, bool)
+    )
+    """Pass chunk lists that already fit in top_n through without reranking when no min_rerank_score is set. Off by default because the rerank order decides which chunks survive token truncation."""
+
+    rerank_results_sorted: bool = field(
+        default=get_env_value("RERANK_RESULTS_SORTED", True, bool)
+    )
+    """Whether rerank_model_func returns documents best first. Lets min_rerank_score filtering stop at a passing last result."""
+
+    enable_rerank_cache: bool = field(
+        default=get_env_value("ENABLE_RERANK_CACHE", False, bool)
+    )
+    """Cache rerank results in memory for repeated (query, documents) inputs."""
+
     # Storage
     # ---
 
@@ -412,7 +427,7 @@ class LightRAG:
             self.ollama_server_infos = OllamaServerInfos()
 
         # Fix global_config now
-        global_config = asdict(self)
+        global_config = self._global_config()
 
         _print_config = ",\n  ".join([f"{k} = {v}" for k, v in global_config.items()])
         logger.debug(f"LightRAG init with param:\n  {_print_config}\n")
@@ -800,6 +815,13 @@ class LightRAG:
             node_label, max_depth, max_nodes
         )
 
+    def _global_config(self) -> dict[str, Any]:
+        """asdict(self), sharing the configured tokenizer instead of a deep copy"""
+        global_config = asdict(self)
+        # Keeps the encoder and the token count cache keyed on it warm across calls
+        global_config["tokenizer"] = self.tokenizer
+        return global_config
+
     def _get_storage_class(self, storage_name: str) -> Callable[..., Any]:
         # Direct imports for default storage implementations
         if storage_name == "JsonKVStorage":
@@ -1409,7 +1431,7 @@ class LightRAG:
                                     knowledge_graph_inst=self.chunk_entity_relation_graph,
                                     entity_vdb=self.entities_vdb,
                                     relationships_vdb=self.relationships_vdb,
-                                    global_config=asdict(self),
+                                    global_config=self._global_config(),
                                     full_entities_storage=self.full_entities,
                                     full_relations_storage=self.full_relations,
                                     doc_id=doc_id,
@@ -1561,7 +1583,7 @@ class LightRAG:
         try:
             chunk_results = await extract_entities(
                 chunk,
-                global_config=asdict(self),
+                global_config=self._global_config(),
                 pipeline_status=pipeline_status,
                 pipeline_status_lock=pipeline_status_lock,
                 llm_response_cache=self.llm_response_cache,
@@ -1827,7 +1849,7 @@ class LightRAG:
             str: The result of the query execution.
         """
         # If a custom model is provided in param, temporarily update global config
-        global_config = asdict(self)
+        global_config = self._global_config()
         # Save original query for vector search
         param.original_query = query
 
@@ -1917,7 +1939,7 @@ class LightRAG:
             relationships_vdb=self.relationships_vdb,
             chunks_vdb=self.chunks_vdb,
             text_chunks_db=self.text_chunks,
-            global_config=asdict(self),
+            global_config=self._global_config(),
             hashing_kv=self.llm_response_cache,
         )
 
@@ -2331,7 +2353,7 @@ class LightRAG:
                             relationships_vdb=self.relationships_vdb,
                             text_chunks_storage=self.text_chunks,
                             llm_response_cache=self.llm_response_cache,
-                            global_config=asdict(self),
+                            global_config=self._global_config(),
                             pipeline_status=pipeline_status,
                             pipeline_status_lock=pipeline_status_lock,
                         )
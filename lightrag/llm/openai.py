@@ -130,6 +130,9 @@ async def openai_complete_if_cache(
             - openai_client_configs: Dict of configuration options for the AsyncOpenAI client.
                 These will be passed to the client constructor but will be overridden by
                 explicit parameters (api_key, base_url).
+            - openai_client: A caller-owned AsyncOpenAI client to reuse across calls.
+                When provided, no client is created and the caller is responsible for
+                closing it; openai_client_configs, api_key and base_url are ignored.
             - hashing_kv: Will be removed from kwargs before passing to OpenAI.
             - keyword_extraction: Will be removed from kwargs before passing to OpenAI.
 
@@ -152,10 +155,18 @@ async def openai_complete_if_cache(
     # Extract client configuration options
     client_configs = kwargs.pop("openai_client_configs", {})
 
-    # Create the OpenAI client
-    openai_async_client = create_openai_async_client(
-        api_key=api_key, base_url=base_url, client_configs=client_configs
-    )
+    # Reuse a caller-owned client if provided, otherwise create one for this call
+    openai_async_client = kwargs.pop("openai_client", None)
+    owns_client = openai_async_client is None
+    if owns_client:
+        openai_async_client = create_openai_async_client(
+            api_key=api_key, base_url=base_url, client_configs=client_configs
+        )
+
+    async def close_client():
+        # Only close clients created by this call; shared clients stay open
+        if owns_client:
+            await openai_async_client.close()
 
     # Remove special kwargs that shouldn't be passed to OpenAI
     kwargs.pop("hashing_kv", None)
@@ -190,21 +201,21 @@ async def openai_complete_if_cache(
             )
     except APIConnectionError as e:
         logger.error(f"OpenAI API Connection Error: {e}")
-        await openai_async_client.close()  # Ensure client is closed
+        await close_client()  # Ensure client is closed
         raise
     except RateLimitError as e:
         logger.error(f"OpenAI API Rate Limit Error: {e}")
-        await openai_async_client.close()  # Ensure client is closed
+        await close_client()  # Ensure client is closed
         raise
     except APITimeoutError as e:
         logger.error(f"OpenAI API Timeout Error: {e}")
-        await openai_async_client.close()  # Ensure client is closed
+        await close_client()  # Ensure client is closed
         raise
     except Exception as e:
         logger.error(
             f"OpenAI API Call Failed,\nModel: {model},\nParams: {kwargs}, Got: {e}"
         )
-        await openai_async_client.close()  # Ensure client is closed
+        await close_client()  # Ensure client is closed
         raise
 
     if hasattr(response, "__aiter__"):
@@ -274,7 +285,7 @@ async def openai_complete_if_cache(
                             f"Failed to close stream response: {close_error}"
                         )
                 # Ensure client is closed in case of exception
-                await openai_async_client.close()
+                await close_client()
                 raise
             finally:
                 # Ensure resources are released even if no exception occurs
@@ -293,7 +304,7 @@ async def openai_complete_if_cache(
 
                 # This prevents resource leaks since the caller doesn't handle closing
                 try:
-                    await openai_async_client.close()
+                    await close_client()
                     logger.debug(
                         "Successfully closed OpenAI client for streaming response"
                     )
@@ -313,14 +324,14 @@ async def openai_complete_if_cache(
                 or not hasattr(response.choices[0].message, "content")
             ):
                 logger.error("Invalid response from OpenAI API")
-                await openai_async_client.close()  # Ensure client is closed
+                await close_client()  # Ensure client is closed
                 raise InvalidResponseError("Invalid response from OpenAI API")
 
             content = response.choices[0].message.content
 
             if not content or content.strip() == "":
                 logger.error("Received empty content from OpenAI API")
-                await openai_async_client.close()  # Ensure client is closed
+                await close_client()  # Ensure client is closed
                 raise InvalidResponseError("Received empty content from OpenAI API")
 
             if r"\u" in content:
@@ -342,7 +353,7 @@ async def openai_complete_if_cache(
             return content
         finally:
             # Ensure client is closed in all cases for non-streaming responses
-            await openai_async_client.close()
+            await close_client()
 
 
 async def openai_complete(
@@ -446,6 +457,7 @@ async def openai_embed(
     base_url: str = None,
     api_key: str = None,
     client_configs: dict[str, Any] = None,
+    openai_client: AsyncOpenAI | None = None,
 ) -> np.ndarray:
     """Generate embeddings for a list of texts using OpenAI's API.
 
@@ -457,6 +469,9 @@ async def openai_embed(
         client_configs: Additional configuration options for the AsyncOpenAI client.
             These will override any default configurations but will be overridden by
             explicit parameters (api_key, base_url).
+        openai_client: Optional caller-owned AsyncOpenAI client reused across calls so
+            connections stay alive. It is not closed here; api_key, base_url and
+            client_configs are ignored when it is provided.
 
     Returns:
         A numpy array of embeddings, one per input text.
@@ -466,18 +481,24 @@ async def openai_embed(
         RateLimitError: If the OpenAI API rate limit is exceeded.
         APITimeoutError: If the OpenAI API request times out.
     """
-    # Create the OpenAI client
-    openai_async_client = create_openai_async_client(
-        api_key=api_key, base_url=base_url, client_configs=client_configs
-    )
-
-    async with openai_async_client:
-        response = await openai_async_client.embeddings.create(
+    if openai_client is not None:
+        response = await openai_client.embeddings.create(
             model=model, input=texts, encoding_format="base64"
         )
-        return np.array(
-            [
-                np.frombuffer(base64.b64decode(dp.embedding), dtype=np.float32)
-                for dp in response.data
-            ]
+    else:
+        # Create the OpenAI client
+        openai_async_client = create_openai_async_client(
+            api_key=api_key, base_url=base_url, client_configs=client_configs
         )
+
+        async with openai_async_client:
+            response = await openai_async_client.embeddings.create(
+                model=model, input=texts, encoding_format="base64"
+            )
+
+    return np.array(
+        [
+            np.frombuffer(base64.b64decode(dp.embedding), dtype=np.float32)
+            for dp in response.data
+        ]
+    )
@@ -1,22 +1,35 @@
 from __future__ import annotations
-import weakref
 
 import asyncio
+import atexit
 import html
+import inspect
+import itertools
 import csv
+import heapq
 import json
 import logging
 import logging.handlers
+import math
 import os
+import queue
 import re
-import uuid
+import threading
+import time
+from collections import OrderedDict, deque
+from collections.abc import AsyncIterable
 from dataclasses import dataclass
-from datetime import datetime
-from functools import wraps
-from hashlib import md5
+from functools import lru_cache, wraps
+from hashlib import blake2b, md5
 from typing import Any, Protocol, Callable, TYPE_CHECKING, List
 import numpy as np
 from dotenv import load_dotenv
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used instead
+    orjson = None
+
 from lightrag.constants import (
     DEFAULT_LOG_MAX_BYTES,
     DEFAULT_LOG_BACKUP_COUNT,
@@ -26,6 +39,15 @@ from lightrag.constants import (
     DEFAULT_MAX_FILE_PATH_LENGTH,
 )
 
+# Regexes used on hot text-cleaning paths, compiled once at import
+_CTRL_RE = re.compile(r"[\x00-\x1f\x7f-\x9f]")
+_FLOAT_RE = re.compile(r"^[-+]?[0-9]*\.?[0-9]+$")
+_NEWLINES_RE = re.compile(r"\n+")
+_UNICODE_ESC = re.compile(r"\\u([0-9a-fA-F]{4})")
+
+
+_BOOL_TRUES = frozenset({"true", "1", "yes", "t", "on"})
+
 
 def get_env_value(
     env_key: str, default: any, value_type: type = str, special_none: bool = False
@@ -33,6 +55,9 @@ def get_env_value(
     """
     Get value from environment variable with type conversion
 
+    Values are read once per argument combination and cached; call
+    `clear_env_cache()` after changing the environment at runtime.
+
     Args:
         env_key (str): Environment variable key
         default (any): Default value if env variable is not set
@@ -42,6 +67,21 @@ def get_env_value(
     Returns:
         any: Converted value from environment or default
     """
+    try:
+        return _cached_env_value(env_key, default, value_type, special_none)
+    except TypeError:
+        # Unhashable default, nothing to cache on
+        return _read_env_value(env_key, default, value_type, special_none)
+
+
+def clear_env_cache() -> None:
+    """Drop cached get_env_value results so the environment is read again"""
+    _cached_env_value.cache_clear()
+
+
+def _read_env_value(
+    env_key: str, default: any, value_type: type, special_none: bool
+) -> any:
     value = os.getenv(env_key)
     if value is None:
         return default
@@ -51,13 +91,16 @@ def get_env_value(
         return None
 
     if value_type is bool:
-        return value.lower() in ("true", "1", "yes", "t", "on")
+        return value.lower() in _BOOL_TRUES
     try:
         return value_type(value)
     except (ValueError, TypeError):
         return default
 
 
+_cached_env_value = lru_cache(maxsize=None)(_read_env_value)
+
+
 # Use TYPE_CHECKING to avoid circular imports
 if TYPE_CHECKING:
     from lightrag.base import BaseKVStorage, QueryParam
@@ -80,20 +123,20 @@ def verbose_debug(msg: str, *args, **kwargs):
         *args: Arguments to be formatted into the message
         **kwargs: Keyword arguments passed to logger.debug()
     """
+    # Skip formatting entirely when the record would be dropped anyway
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     if VERBOSE_DEBUG:
         logger.debug(msg, *args, **kwargs)
     else:
         # Format the message with args first
-        if args:
-            formatted_msg = msg % args
-        else:
-            formatted_msg = msg
+        formatted_msg = msg % args if args else msg
         # Then truncate the formatted message
         truncated_msg = (
-            formatted_msg[:150] + "..." if len(formatted_msg) > 150 else formatted_msg
+            formatted_msg if len(formatted_msg) <= 150 else formatted_msg[:150] + "..."
         )
         # Remove consecutive newlines
-        truncated_msg = re.sub(r"\n+", "\n", truncated_msg)
+        truncated_msg = _NEWLINES_RE.sub("\n", truncated_msg)
         logger.debug(truncated_msg, **kwargs)
 
 
@@ -121,43 +164,176 @@ class LightragPathFilter(logging.Filter):
     def __init__(self):
         super().__init__()
         # Define paths to be filtered
-        self.filtered_paths = [
-            "/documents",
-            "/documents/paginated",
-            "/health",
-            "/webui/",
-            "/documents/pipeline_status",
-        ]
-        # self.filtered_paths = ["/health", "/webui/"]
+        self.filtered_paths = frozenset(
+            {
+                "/documents",
+                "/documents/paginated",
+                "/health",
+                "/webui/",
+                "/documents/pipeline_status",
+            }
+        )
+        # self.filtered_paths = frozenset({"/health", "/webui/"})
 
     def filter(self, record):
         try:
-            # Check if record has the required attributes for an access log
-            if not hasattr(record, "args") or not isinstance(record.args, tuple):
+            # Access log args are (client_addr, method, path, http_version, status)
+            args = record.args
+            method = args[1]
+            path = args[2]
+            status = args[4]
+        except (IndexError, TypeError, KeyError):
+            # Not an access log record
+            return True
+
+        try:
+            # Filter out successful GET/POST requests to filtered paths
+            if status not in (200, 304):
                 return True
-            if len(record.args) < 5:
+            if path not in self.filtered_paths:
                 return True
-
-            # Extract method, path and status from the record args
-            method = record.args[1]
-            path = record.args[2]
-            status = record.args[4]
-
-            # Filter out successful GET requests to filtered paths
-            if (
-                method == "GET"
-                or method == "POST"
-                and (status == 200 or status == 304)
-                and path in self.filtered_paths
-            ):
-                return False
-
-            return True
+            if method not in ("GET", "POST"):
+                return True
+            return False
         except Exception:
             # In case of any error, let the message through
             return True
 
 
+class FastRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler that tracks the file size in process
+
+    The stock handler stats the file and seeks to its end on every record to
+    decide whether to roll over. This one keeps a running count of the encoded
+    bytes written and only consults the file once the count reaches maxBytes,
+    so a file may exceed maxBytes by at most one record. The count is per handler:
+    setup_logger shares one handler per file within a process, but separate
+    processes writing the same file (e.g. gunicorn workers) each keep their own.
+    """
+
+    def __init__(self, *args, **kwargs):
+        # None means the file size is unknown and must be read from the stream
+        self._bytes_written: int | None = None
+        super().__init__(*args, **kwargs)
+
+    def format(self, record):
+        msg = super().format(record)
+        if self._bytes_written is not None:
+            if msg.isascii():
+                size = len(msg)
+            else:
+                size = len(msg.encode(self.encoding or "utf-8", "replace"))
+            self._bytes_written += size + len(self.terminator)
+        return msg
+
+    def shouldRollover(self, record):
+        if self.maxBytes <= 0:
+            return False
+        if self._bytes_written is not None and self._bytes_written < self.maxBytes:
+            return False
+        rollover = super().shouldRollover(record)
+        if not rollover and self.stream is not None:
+            self._bytes_written = self.stream.tell()
+        return rollover
+
+    def doRollover(self):
+        super().doRollover()
+        self._bytes_written = 0
+
+
+class BufferedRotatingFileHandler(FastRotatingFileHandler):
+    """RotatingFileHandler that buffers writes instead of flushing every record
+
+    The buffer is flushed immediately for records at or above flush_level, and
+    otherwise at most every flush_interval seconds by a background thread.
+    """
+
+    def __init__(
+        self,
+        *args,
+        buffer_size: int = 65536,
+        flush_interval: float = 30.0,
+        flush_level: int = logging.WARNING,
+        **kwargs,
+    ):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._defer_flush = False
+        super().__init__(*args, **kwargs)
+        # Not named _closed: logging.Handler.close() sets that attribute to True
+        self._stop_flusher = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_periodically, name="lightrag-log-flush", daemon=True
+        )
+        self._flusher.start()
+
+    def _open(self):
+        return open(
+            self.baseFilename,
+            self.mode,
+            buffering=self.buffer_size,
+            encoding=self.encoding,
+            errors=self.errors,
+        )
+
+    def _flush_periodically(self):
+        while not self._stop_flusher.wait(self.flush_interval):
+            self.flush()
+
+    def emit(self, record):
+        # StreamHandler.emit flushes after every write; only let that through for
+        # records that must reach the file right away
+        self._defer_flush = record.levelno < self.flush_level
+        try:
+            super().emit(record)
+        finally:
+            self._defer_flush = False
+
+    def flush(self):
+        if not self._defer_flush:
+            super().flush()
+
+    def close(self):
+        # Safe to call repeatedly (logging.shutdown, dictConfig, listener teardown)
+        self._stop_flusher.set()
+        super().close()
+
+
+# log file path -> (queue, listener) shared by every logger writing that file, so each
+# file has one handler, one buffer and one size count per process
+_log_file_outputs: dict[
+    str, tuple[queue.SimpleQueue, logging.handlers.QueueListener]
+] = {}
+# logger name -> log file path it writes to
+_logger_log_files: dict[str, str] = {}
+
+
+def _close_log_output(listener: logging.handlers.QueueListener) -> None:
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+
+def _release_log_file(log_file_path: str | None) -> None:
+    """Stop the shared file output once no logger writes to it any more"""
+    if log_file_path is None or log_file_path in _logger_log_files.values():
+        return
+    output = _log_file_outputs.pop(log_file_path, None)
+    if output is not None:
+        _close_log_output(output[1])
+
+
+def _stop_log_listeners():
+    for _, listener in _log_file_outputs.values():
+        _close_log_output(listener)
+    _log_file_outputs.clear()
+    _logger_log_files.clear()
+
+
+atexit.register(_stop_log_listeners)
+
+
 def setup_logger(
     logger_name: str,
     level: str = "INFO",
@@ -183,6 +359,7 @@ def setup_logger(
     logger_instance = logging.getLogger(logger_name)
     logger_instance.setLevel(level)
     logger_instance.handlers = []  # Clear existing handlers
+    previous_log_file = _logger_log_files.pop(logger_name, None)
     logger_instance.propagate = False
 
     # Add console handler
@@ -198,6 +375,8 @@ def setup_logger(
             log_dir = os.getenv("LOG_DIR", os.getcwd())
             log_file_path = os.path.abspath(os.path.join(log_dir, DEFAULT_LOG_FILENAME))
 
+        log_file_path = os.path.abspath(log_file_path)
+
         # Ensure log directory exists
         os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
 
@@ -208,34 +387,62 @@ def setup_logger(
         )
 
         try:
-            # Add file handler
-            file_handler = logging.handlers.RotatingFileHandler(
-                filename=log_file_path,
-                maxBytes=log_max_bytes,
-                backupCount=log_backup_count,
-                encoding="utf-8",
-            )
-            file_handler.setFormatter(detailed_formatter)
-            file_handler.setLevel(level)
-            logger_instance.addHandler(file_handler)
+            output = _log_file_outputs.get(log_file_path)
+            if output is None:
+                # Add file handler; writes happen on the listener thread, off the caller's path
+                file_handler = BufferedRotatingFileHandler(
+                    filename=log_file_path,
+                    maxBytes=log_max_bytes,
+                    backupCount=log_backup_count,
+                    encoding="utf-8",
+                )
+                file_handler.setFormatter(detailed_formatter)
+                log_queue = queue.SimpleQueue()
+                listener = logging.handlers.QueueListener(
+                    log_queue, file_handler, respect_handler_level=True
+                )
+                listener.start()
+                output = _log_file_outputs[log_file_path] = (log_queue, listener)
+            # Level filtering happens per logger, before records reach the shared queue
+            queue_handler = logging.handlers.QueueHandler(output[0])
+            queue_handler.setLevel(level)
+            logger_instance.addHandler(queue_handler)
+            _logger_log_files[logger_name] = log_file_path
         except PermissionError as e:
             logger.warning(f"Could not create log file at {log_file_path}: {str(e)}")
             logger.warning("Continuing with console logging only")
 
+    if previous_log_file != _logger_log_files.get(logger_name):
+        _release_log_file(previous_log_file)
+
     # Add path filter if requested
     if add_filter:
         path_filter = LightragPathFilter()
         logger_instance.addFilter(path_filter)
 
 
+class _Ready:
+    """Awaitable that completes immediately with None, without a coroutine frame."""
+
+    __slots__ = ()
+
+    def __await__(self):
+        return iter(())
+
+
+_READY = _Ready()
+
+
 class UnlimitedSemaphore:
     """A context manager that allows unlimited access."""
 
-    async def __aenter__(self):
-        pass
+    __slots__ = ()
 
-    async def __aexit__(self, exc_type, exc, tb):
-        pass
+    def __aenter__(self):
+        return _READY
+
+    def __aexit__(self, exc_type, exc, tb):
+        return _READY
 
 
 @dataclass
@@ -248,20 +455,66 @@ class EmbeddingFunc:
         return await self.func(*args, **kwargs)
 
 
+def _args_hash_blake2b(args: tuple) -> str:
+    # BLAKE2b with a 16-byte digest keeps the MD5 key width but hashes faster.
+    # Arguments are fed incrementally instead of being joined into one string,
+    # with a separator so ("ab", "c") and ("a", "bc") hash differently.
+    hasher = blake2b(digest_size=16)
+    for arg in args:
+        hasher.update((arg if isinstance(arg, str) else str(arg)).encode("utf-8"))
+        hasher.update(b"\x1f")
+    return hasher.hexdigest()
+
+
+def _args_hash_md5(args: tuple) -> str:
+    # Legacy scheme, kept so caches written before the BLAKE2b switch still hit
+    return md5("".join([str(arg) for arg in args]).encode()).hexdigest()
+
+
+def _args_hash_xxh3(args: tuple) -> str:
+    hasher = xxhash.xxh3_128()
+    for arg in args:
+        hasher.update((arg if isinstance(arg, str) else str(arg)).encode("utf-8"))
+        hasher.update(b"\x1f")
+    return hasher.hexdigest()
+
+
+_ARGS_HASH_FUNCS = {
+    "blake2b": _args_hash_blake2b,
+    "md5": _args_hash_md5,
+    "xxh3": _args_hash_xxh3,
+}
+
+# LLM cache keys depend on this choice, so it is explicit configuration rather
+# than whatever hash library happens to be installed
+LLM_CACHE_HASH = get_env_value("LLM_CACHE_HASH", "blake2b").lower()
+if LLM_CACHE_HASH not in _ARGS_HASH_FUNCS:
+    logger.warning(f"Unknown LLM_CACHE_HASH '{LLM_CACHE_HASH}', using blake2b")
+    LLM_CACHE_HASH = "blake2b"
+if LLM_CACHE_HASH == "xxh3":
+    try:
+        import xxhash
+    except ImportError:
+        logger.warning(
+            "LLM_CACHE_HASH=xxh3 requires `pip install xxhash`, using blake2b"
+        )
+        LLM_CACHE_HASH = "blake2b"
+_args_hash = _ARGS_HASH_FUNCS[LLM_CACHE_HASH]
+
+
 def compute_args_hash(*args: Any) -> str:
     """Compute a hash for the given arguments.
+
+    The algorithm is selected with the LLM_CACHE_HASH environment variable:
+    blake2b (default), md5 (keys compatible with older caches) or xxh3
+    (requires the xxhash package).
+
     Args:
         *args: Arguments to hash
     Returns:
-        str: Hash string
+        str: Hash string (32 hex characters)
     """
-    import hashlib
-
-    # Convert all arguments to strings and join them
-    args_str = "".join([str(arg) for arg in args])
-
-    # Compute MD5 hash
-    return hashlib.md5(args_str.encode()).hexdigest()
+    return _args_hash(args)
 
 
 def generate_cache_key(mode: str, cache_type: str, hash_value: str) -> str:
@@ -287,10 +540,13 @@ def parse_cache_key(cache_key: str) -> tuple[str, str, str] | None:
     Returns:
         tuple[str, str, str] | None: (mode, cache_type, hash) or None if invalid format
     """
-    parts = cache_key.split(":", 2)
-    if len(parts) == 3:
-        return parts[0], parts[1], parts[2]
-    return None
+    mode, sep, rest = cache_key.partition(":")
+    if not sep:
+        return None
+    cache_type, sep, hash_value = rest.partition(":")
+    if not sep:
+        return None
+    return mode, cache_type, hash_value
 
 
 def compute_mdhash_id(content: str, prefix: str = "") -> str:
@@ -309,6 +565,51 @@ class QueueFullError(Exception):
     pass
 
 
+class _PriorityTaskQueue:
+    """Minimal heapq-backed replacement for asyncio.PriorityQueue
+
+    Implements only what priority_limit_async_func_call needs: put, get,
+    task_done and join. Capacity is enforced with a semaphore and waiting
+    consumers park on an Event, avoiding asyncio.Queue's Condition bookkeeping.
+    """
+
+    def __init__(self, maxsize: int = 0):
+        self._heap: list = []
+        self._has_items = asyncio.Event()
+        # maxsize <= 0 means unbounded, as for asyncio.Queue
+        self._space = asyncio.Semaphore(maxsize) if maxsize > 0 else None
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    async def put(self, item) -> None:
+        if self._space is not None:
+            await self._space.acquire()
+        heapq.heappush(self._heap, item)
+        self._unfinished += 1
+        self._finished.clear()
+        self._has_items.set()
+
+    async def get(self):
+        while not self._heap:
+            self._has_items.clear()
+            await self._has_items.wait()
+        item = heapq.heappop(self._heap)
+        if self._space is not None:
+            self._space.release()
+        return item
+
+    def task_done(self) -> None:
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self) -> None:
+        await self._finished.wait()
+
+
 def priority_limit_async_func_call(max_size: int, max_queue_size: int = 1000):
     """
     Enhanced priority-limited asynchronous function call decorator
@@ -324,66 +625,66 @@ def priority_limit_async_func_call(max_size: int, max_queue_size: int = 1000):
         # Ensure func is callable
         if not callable(func):
             raise TypeError(f"Expected a callable object, got {type(func)}")
-        queue = asyncio.PriorityQueue(maxsize=max_queue_size)
+        queue = _PriorityTaskQueue(maxsize=max_queue_size)
         tasks = set()
         initialization_lock = asyncio.Lock()
-        counter = 0
+        # Tie-breaker that keeps FIFO order within a priority; next() is atomic on the event loop
+        counter = itertools.count()
         shutdown_event = asyncio.Event()
         initialized = False  # Global initialization flag
         worker_health_check_task = None
 
-        # Track active future objects for cleanup
-        active_futures = weakref.WeakSet()
+        # Track active future objects for cleanup; wait_func discards them when done
+        active_futures = set()
         reinit_count = 0  # Reinitialization counter to track system health
 
         # Worker function to process tasks in the queue
         async def worker():
             """Worker that processes tasks in the priority queue"""
+            # Bind hot attributes once instead of looking them up per task
+            queue_get, task_done = queue.get, queue.task_done
+            is_shutdown = shutdown_event.is_set
+            wait_for = asyncio.wait_for
+            log_error, log_debug = logger.error, logger.debug
             try:
-                while not shutdown_event.is_set():
+                while not is_shutdown():
                     try:
                         # Use timeout to get tasks, allowing periodic checking of shutdown signal
-                        try:
-                            (
-                                priority,
-                                count,
-                                future,
-                                args,
-                                kwargs,
-                            ) = await asyncio.wait_for(queue.get(), timeout=1.0)
-                        except asyncio.TimeoutError:
-                            # Timeout is just to check shutdown signal, continue to next iteration
-                            continue
-
-                        # If future is cancelled, skip execution
-                        if future.cancelled():
-                            queue.task_done()
-                            continue
-
-                        try:
-                            # Execute function
-                            result = await func(*args, **kwargs)
-                            # If future is not done, set the result
-                            if not future.done():
-                                future.set_result(result)
-                        except asyncio.CancelledError:
-                            if not future.done():
-                                future.cancel()
-                            logger.debug("limit_async: Task cancelled during execution")
-                        except Exception as e:
-                            logger.error(
-                                f"limit_async: Error in decorated function: {str(e)}"
-                            )
-                            if not future.done():
-                                future.set_exception(e)
-                        finally:
-                            queue.task_done()
+                        priority, count, future, args, kwargs = await wait_for(
+                            queue_get(), timeout=1.0
+                        )
+                    except asyncio.TimeoutError:
+                        # Timeout is just to check shutdown signal, continue to next iteration
+                        continue
                     except Exception as e:
                         # Catch all exceptions in worker loop to prevent worker termination
-                        logger.error(f"limit_async: Critical error in worker: {str(e)}")
+                        log_error(f"limit_async: Critical error in worker: {str(e)}")
                         await asyncio.sleep(0.1)  # Prevent high CPU usage
+                        continue
+
+                    # If future is cancelled, skip execution
+                    if future.cancelled():
+                        task_done()
+                        continue
+
+                    try:
+                        # Execute function
+                        result = await func(*args, **kwargs)
+                        # If future is not done, set the result
+                        if not future.done():
+                            future.set_result(result)
+                    except asyncio.CancelledError:
+                        if not future.done():
+                            future.cancel()
+                        log_debug("limit_async: Task cancelled during execution")
+                    except Exception as e:
+                        log_error(f"limit_async: Error in decorated function: {str(e)}")
+                        if not future.done():
+                            future.set_exception(e)
+                    finally:
+                        task_done()
             finally:
-                logger.debug("limit_async: Worker exiting")
+                log_debug("limit_async: Worker exiting")
 
         async def health_check():
             """Periodically check worker health status and recover"""
@@ -528,16 +829,14 @@ def priority_limit_async_func_call(max_size: int, max_queue_size: int = 1000):
                 Any exception raised by the decorated function
             """
             # Ensure worker system is initialized
-            await ensure_workers()
+            if not initialized:
+                await ensure_workers()
 
             # Create a future for the result
             future = asyncio.Future()
             active_futures.add(future)
 
-            nonlocal counter
-            async with initialization_lock:
-                current_count = counter  # Use local variable to avoid race conditions
-                counter += 1
+            current_count = next(counter)
 
             # Try to put the task into the queue, supporting timeout
             try:
@@ -604,11 +903,50 @@ def wrap_embedding_func_with_attrs(**kwargs):
 def load_json(file_name):
     if not os.path.exists(file_name):
         return None
+    if orjson is not None:
+        with open(file_name, "rb") as f:
+            data = f.read()
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. NaN/Infinity tokens written by json.dump, which orjson rejects
+            return json.loads(data)
     with open(file_name, encoding="utf-8") as f:
         return json.load(f)
 
 
+def _has_non_finite_float(obj) -> bool:
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, float):
+            if not math.isfinite(item):
+                return True
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return False
+
+
 def write_json(json_obj, file_name):
+    if orjson is not None:
+        try:
+            # Same layout as json.dump(indent=2, ensure_ascii=False)
+            data = orjson.dumps(
+                json_obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+            )
+        except orjson.JSONEncodeError:
+            # e.g. integers beyond 64 bits, which stdlib json still handles
+            data = None
+        # orjson writes NaN/inf as null; leave those to json.dump, which keeps
+        # them. Only output containing null can be affected, so most skip the walk
+        if data is not None and b"null" in data and _has_non_finite_float(json_obj):
+            data = None
+        if data is not None:
+            with open(file_name, "wb") as f:
+                f.write(data)
+            return
     with open(file_name, "w", encoding="utf-8") as f:
         json.dump(json_obj, f, indent=2, ensure_ascii=False)
 
@@ -626,6 +964,9 @@ class TokenizerInterface(Protocol):
         """Decodes a list of tokens into a string."""
         ...
 
+    # Tokenizers may also provide `encode_batch(texts: List[str]) -> List[List[int]]`;
+    # Tokenizer.encode_batch uses it when present.
+
 
 class Tokenizer:
     """
@@ -655,6 +996,21 @@ class Tokenizer:
         """
         return self.tokenizer.encode(content)
 
+    def encode_batch(self, contents: List[str]) -> List[List[int]]:
+        """
+        Encodes several strings, using the underlying tokenizer's batch API when it has one.
+
+        Args:
+            contents: The strings to encode.
+
+        Returns:
+            A list of token lists, one per input string.
+        """
+        encode_batch = getattr(self.tokenizer, "encode_batch", None)
+        if encode_batch is not None:
+            return encode_batch(contents)
+        return [self.tokenizer.encode(content) for content in contents]
+
     def decode(self, tokens: List[int]) -> str:
         """
         Decodes a list of tokens into a string using the underlying tokenizer.
@@ -668,11 +1024,39 @@ class Tokenizer:
         return self.tokenizer.decode(tokens)
 
 
+@lru_cache(maxsize=None)
+def _get_tiktoken_encoding(model_name: str):
+    """Load the tiktoken encoding for a model once; building the BPE table is expensive."""
+    try:
+        import tiktoken  # 使用OpenAI的tiktoken库
+    except ImportError:
+        raise ImportError(
+            "tiktoken is not installed. Please install it with `pip install tiktoken` or define custom `tokenizer_func`."
+        )
+
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        raise ValueError(f"Invalid model_name: {model_name}.")
+
+
+# (class, model_name) -> TiktokenTokenizer, so repeated construction reuses one instance
+_tiktoken_tokenizers: dict[tuple[type, str], "TiktokenTokenizer"] = {}
+
+
 class TiktokenTokenizer(Tokenizer):
     """
     A Tokenizer implementation using the tiktoken library.
+
+    Instances are shared per model name, so constructing one is cheap after the first call.
     """
 
+    def __new__(cls, model_name: str = "gpt-4o-mini"):
+        instance = _tiktoken_tokenizers.get((cls, model_name))
+        if instance is None:
+            instance = super().__new__(cls)
+        return instance
+
     def __init__(self, model_name: str = "gpt-4o-mini"):
         """
         Initializes the TiktokenTokenizer with a specified model name.
@@ -684,18 +1068,11 @@ class TiktokenTokenizer(Tokenizer):
             ImportError: If tiktoken is not installed.
             ValueError: If the model_name is invalid.
         """
-        try:
-            import tiktoken # 使用OpenAI的tiktoken库
-        except ImportError:
-            raise ImportError(
-                "tiktoken is not installed. Please install it with `pip install tiktoken` or define custom `tokenizer_func`."
-            )
-
-        try:
-            tokenizer = tiktoken.encoding_for_model(model_name)
-            super().__init__(model_name=model_name, tokenizer=tokenizer)
-        except KeyError:
-            raise ValueError(f"Invalid model_name: {model_name}.")
+        if (type(self), model_name) in _tiktoken_tokenizers:
+            return
+        tokenizer = _get_tiktoken_encoding(model_name)
+        super().__init__(model_name=model_name, tokenizer=tokenizer)
+        _tiktoken_tokenizers[(type(self), model_name)] = self
 
 
 def pack_user_ass_to_openai_messages(*args: str):
@@ -705,13 +1082,32 @@ def pack_user_ass_to_openai_messages(*args: str):
     ]
 
 
+@lru_cache(maxsize=128)
+def _multi_marker_pattern(markers: tuple[str, ...]) -> re.Pattern:
+    return re.compile("|".join(re.escape(marker) for marker in markers))
+
+
+@lru_cache(maxsize=128)
+def _single_char_marker_table(markers: tuple[str, ...]) -> dict[int, str]:
+    # Map every marker onto the first one so a single str.split() does the work
+    return str.maketrans(dict.fromkeys(markers, markers[0]))
+
+
 def split_string_by_multi_markers(content: str, markers: list[str]) -> list[str]:
     """Split a string by multiple markers"""
     if not markers:
         return [content]
     content = content if content is not None else ""
-    results = re.split("|".join(re.escape(marker) for marker in markers), content)
-    return [r.strip() for r in results if r.strip()]
+    if len(markers) == 1 and markers[0]:
+        results = content.split(markers[0])
+    elif all(len(marker) == 1 for marker in markers):
+        markers = tuple(markers)
+        results = content.translate(_single_char_marker_table(markers)).split(
+            markers[0]
+        )
+    else:
+        results = _multi_marker_pattern(tuple(markers)).split(content)
+    return [r for r in (part.strip() for part in results) if r]
 
 
 # Refer the utils functions of the official GraphRAG implementation:
@@ -722,13 +1118,68 @@ def clean_str(input: Any) -> str:
     if not isinstance(input, str):
         return input
 
-    result = html.unescape(input.strip())
+    result = input.strip()
+    # html.unescape only changes strings containing an entity
+    if "&" in result:
+        result = html.unescape(result)
     # https://stackoverflow.com/questions/4324790/removing-control-characters-from-a-string-in-python
-    return re.sub(r"[\x00-\x1f\x7f-\x9f]", "", result)
+    if _CTRL_RE.search(result) is None:
+        return result
+    return _CTRL_RE.sub("", result)
 
 
 def is_float_regex(value: str) -> bool:
-    return bool(re.match(r"^[-+]?[0-9]*\.?[0-9]+$", value))
+    return bool(_FLOAT_RE.match(value))
+
+
+# Token counts of recently seen texts, keyed by (tokenizer, text). Chunk bodies recur
+# across queries, so warm lookups skip tokenization. Long texts are keyed by a digest
+# so the cache does not pin their full contents.
+_TOKEN_LEN_CACHE_SIZE = 100_000
+_TOKEN_LEN_DIGEST_MIN = 256
+_token_len_cache: OrderedDict[tuple, int] = OrderedDict()
+_token_len_cache_lock = threading.Lock()
+
+
+def _token_len_key(tokenizer: Tokenizer, content: str) -> tuple:
+    if len(content) >= _TOKEN_LEN_DIGEST_MIN:
+        return tokenizer, blake2b(
+            content.encode("utf-8", "surrogatepass"), digest_size=16
+        ).digest()
+    return tokenizer, content
+
+
+def count_tokens_batch(tokenizer: Tokenizer, contents: list[str]) -> list[int]:
+    """Return the token count of each text, tokenizing only those not cached"""
+    keys = [_token_len_key(tokenizer, content) for content in contents]
+    with _token_len_cache_lock:
+        counts = [_token_len_cache.get(key) for key in keys]
+        for key, count in zip(keys, counts):
+            if count is not None:
+                _token_len_cache.move_to_end(key)
+
+    misses = [i for i, count in enumerate(counts) if count is None]
+    if misses:
+        encoded = tokenizer.encode_batch([contents[i] for i in misses])
+        with _token_len_cache_lock:
+            for i, tokens in zip(misses, encoded):
+                counts[i] = len(tokens)
+                _token_len_cache[keys[i]] = counts[i]
+            while len(_token_len_cache) > _TOKEN_LEN_CACHE_SIZE:
+                _token_len_cache.popitem(last=False)
+    return counts
+
+
+def clear_tokenizer_cache() -> None:
+    """Drop all cached token counts"""
+    with _token_len_cache_lock:
+        _token_len_cache.clear()
+
+
+def _truncate_fast(lengths: list[int], budget: int) -> int:
+    """Number of leading items whose cumulative length stays within the budget"""
+    cumulative = np.cumsum(np.asarray(lengths, dtype=np.int64))
+    return int(np.searchsorted(cumulative, budget, side="right"))
 
 
 def truncate_list_by_token_size(
@@ -740,20 +1191,34 @@ def truncate_list_by_token_size(
     """Truncate a list of data by token size"""
     if max_token_size <= 0:
         return []
-    tokens = 0
-    for i, data in enumerate(list_data):
-        tokens += len(tokenizer.encode(key(data)))
-        if tokens > max_token_size:
-            return list_data[:i]
+    if not list_data:
+        return list_data
+    cutoff = _truncate_fast(
+        count_tokens_batch(tokenizer, [key(data) for data in list_data]),
+        max_token_size,
+    )
+    if cutoff < len(list_data):
+        return list_data[:cutoff]
     return list_data
 
 
 def cosine_similarity(v1, v2):
     """Calculate cosine similarity between two vectors"""
-    dot_product = np.dot(v1, v2)
-    norm1 = np.linalg.norm(v1)
-    norm2 = np.linalg.norm(v2)
-    return dot_product / (norm1 * norm2)
+    return cosine_similarity_batch(v1, np.asarray(v2)[np.newaxis, :])[0]
+
+
+def cosine_similarity_batch(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Calculate cosine similarity between a query vector and each row of a matrix
+
+    Inputs are computed in float32. If both sides are already L2-normalized the
+    result is simply `matrix @ query`, and callers can skip this function.
+    Rows (or a query) with zero norm score 0.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    norms[norms == 0] = 1.0
+    return (matrix @ query) / norms
 
 
 async def handle_cache(
@@ -767,11 +1232,23 @@ async def handle_cache(
     if hashing_kv is None:
         return None, None, None, None
 
+    # Read the cache switches from global_config once per storage instance;
+    # delete hashing_kv._cached_cache_flags if global_config is changed later
+    flags = getattr(hashing_kv, "_cached_cache_flags", None)
+    if flags is None:
+        global_config = hashing_kv.global_config
+        flags = (
+            global_config.get("enable_llm_cache"),
+            global_config.get("enable_llm_cache_for_entity_extract"),
+        )
+        hashing_kv._cached_cache_flags = flags
+    enable_llm_cache, enable_llm_cache_for_entity_extract = flags
+
     if mode != "default":  # handle cache for all type of query
-        if not hashing_kv.global_config.get("enable_llm_cache"):
+        if not enable_llm_cache:
             return None, None, None, None
     else:  # handle cache for entity extraction
-        if not hashing_kv.global_config.get("enable_llm_cache_for_entity_extract"):
+        if not enable_llm_cache_for_entity_extract:
             return None, None, None, None
 
     # Use flattened cache key format: {mode}:{cache_type}:{hash}
@@ -785,7 +1262,7 @@ async def handle_cache(
     return None, None, None, None
 
 
-@dataclass
+@dataclass(slots=True)
 class CacheData:
     args_hash: str
     content: str
@@ -804,11 +1281,11 @@ async def save_to_cache(hashing_kv, cache_data: CacheData):
         cache_data: The cache data to save
     """
     # Skip if storage is None or content is a streaming response
-    if hashing_kv is None or not cache_data.content:
+    if hashing_kv is None or cache_data.content in (None, ""):
         return
 
     # If content is a streaming response, don't cache it
-    if hasattr(cache_data.content, "__aiter__"):
+    if isinstance(cache_data.content, AsyncIterable):
         logger.debug("Streaming response detected, skipping cache")
         return
 
@@ -829,11 +1306,9 @@ async def save_to_cache(hashing_kv, cache_data: CacheData):
     cache_entry = {
         "return": cache_data.content,
         "cache_type": cache_data.cache_type,
-        "chunk_id": cache_data.chunk_id if cache_data.chunk_id is not None else None,
+        "chunk_id": cache_data.chunk_id,
         "original_prompt": cache_data.prompt,
-        "queryparam": cache_data.queryparam
-        if cache_data.queryparam is not None
-        else None,
+        "queryparam": cache_data.queryparam,
     }
 
     logger.info(f" == LLM cache == saving: {flattened_key}")
@@ -842,9 +1317,22 @@ async def save_to_cache(hashing_kv, cache_data: CacheData):
     await hashing_kv.upsert({flattened_key: cache_entry})
 
 
+# Force the regex implementation of safe_unicode_decode (for parity testing)
+UNICODE_DECODE_USE_REGEX = get_env_value("UNICODE_DECODE_USE_REGEX", False, bool)
+
+
 def safe_unicode_decode(content):
-    # Regular expression to find all Unicode escape sequences of the form \uXXXX
-    unicode_escape_pattern = re.compile(r"\\u([0-9a-fA-F]{4})")
+    text = content.decode("utf-8")
+
+    # When every backslash starts a \uXXXX escape, the C unicode_escape codec gives
+    # the same result as the regex below; any other backslash (\n, \\, LaTeX, ...)
+    # would be rewritten by the codec, so those inputs take the regex path.
+    if not UNICODE_DECODE_USE_REGEX and text.count("\\") == text.count("\\u"):
+        try:
+            return text.encode("latin-1", "backslashreplace").decode("unicode_escape")
+        except UnicodeDecodeError:
+            # \u not followed by four hex digits
+            pass
 
     # Function to replace the Unicode escape with the actual character
     def replace_unicode_escape(match):
@@ -852,9 +1340,7 @@ def safe_unicode_decode(content):
         return chr(int(match.group(1), 16))
 
     # Perform the substitution
-    decoded_content = unicode_escape_pattern.sub(
-        replace_unicode_escape, content.decode("utf-8")
-    )
+    decoded_content = _UNICODE_ESC.sub(replace_unicode_escape, text)
 
     return decoded_content
 
@@ -865,10 +1351,11 @@ def exists_func(obj, func_name: str) -> bool:
     :param func_name:
     :return: True / False
     """
-    if callable(getattr(obj, func_name, None)):
-        return True
-    else:
-        return False
+    return callable(getattr(obj, func_name, None))
+
+
+# Assistant messages starting with these are keyword extraction output, not dialogue
+_KEYWORD_EXTRACTION_PREFIXES = ('{ "high_level_keywords"', "{'high_level_keywords'")
 
 
 def get_conversation_turns(
@@ -888,40 +1375,27 @@ def get_conversation_turns(
     if num_turns <= 0:
         return ""
 
-    # Group messages into turns
-    turns: list[list[dict[str, Any]]] = []
-    messages: list[dict[str, Any]] = []
+    # Single pass: drop keyword extraction messages and pair the remaining
+    # messages positionally (0-1, 2-3, ...); the deque keeps the most recent turns
+    turns: deque[tuple[dict[str, Any], dict[str, Any]]] = deque(maxlen=num_turns)
+    pending: dict[str, Any] | None = None
 
-    # First, filter out keyword extraction messages
     for msg in conversation_history:
-        if msg["role"] == "assistant" and (
-            msg["content"].startswith('{ "high_level_keywords"')
-            or msg["content"].startswith("{'high_level_keywords'")
+        if msg["role"] == "assistant" and msg["content"].startswith(
+            _KEYWORD_EXTRACTION_PREFIXES
         ):
             continue
-        messages.append(msg)
-
-    # Then process messages in chronological order
-    i = 0
-    while i < len(messages) - 1:
-        msg1 = messages[i]
-        msg2 = messages[i + 1]
+        if pending is None:
+            pending = msg
+            continue
 
+        msg1, msg2, pending = pending, msg, None
         # Check if we have a user-assistant or assistant-user pair
-        if (msg1["role"] == "user" and msg2["role"] == "assistant") or (
-            msg1["role"] == "assistant" and msg2["role"] == "user"
-        ):
+        if msg1["role"] == "user" and msg2["role"] == "assistant":
+            turns.append((msg1, msg2))
+        elif msg1["role"] == "assistant" and msg2["role"] == "user":
             # Always put user message first in the turn
-            if msg1["role"] == "assistant":
-                turn = [msg2, msg1]  # user, assistant
-            else:
-                turn = [msg1, msg2]  # user, assistant
-            turns.append(turn)
-        i += 2
-
-    # Keep only the most recent num_turns
-    if len(turns) > num_turns:
-        turns = turns[-num_turns:]
+            turns.append((msg2, msg1))
 
     # Format the turns into a string
     formatted_turns: list[str] = []
@@ -944,18 +1418,270 @@ def always_get_an_event_loop() -> asyncio.AbstractEventLoop:
         asyncio.AbstractEventLoop: The current or newly created event loop.
     """
     try:
-        # Try to get the current event loop
-        current_loop = asyncio.get_event_loop()
-        if current_loop.is_closed():
-            raise RuntimeError("Event loop is closed.")
-        return current_loop
+        # Fast path: already running inside a loop
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        pass
 
+    try:
+        # Ask the policy directly to skip the get_event_loop() deprecation machinery
+        current_loop = asyncio.get_event_loop_policy().get_event_loop()
+        if not current_loop.is_closed():
+            return current_loop
     except RuntimeError:
-        # If no event loop exists or it is closed, create a new one
-        logger.info("Creating a new event loop in main thread.")
-        new_loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(new_loop)
-        return new_loop
+        pass
+
+    # If no event loop exists or it is closed, create a new one
+    logger.info("Creating a new event loop in main thread.")
+    new_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(new_loop)
+    return new_loop
+
+
+_EXPORT_BATCH_SIZE = 1000
+
+
+def _export_json(data) -> str:
+    """Serialize a storage record as compact JSON for an export cell"""
+    if data is None:
+        return ""
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                data,
+                default=str,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY,
+            ).decode()
+        except orjson.JSONEncodeError:
+            pass
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+async def _iter_entity_rows(
+    chunk_entity_relation_graph, entities_vdb, include_vector_data: bool
+):
+    """Yield export rows for graph entities, reading storage in batches"""
+    all_entities = await chunk_entity_relation_graph.get_all_labels()
+    for start in range(0, len(all_entities), _EXPORT_BATCH_SIZE):
+        batch = all_entities[start : start + _EXPORT_BATCH_SIZE]
+        # Batch reads: backends override get_nodes_batch with a single query
+        nodes = await chunk_entity_relation_graph.get_nodes_batch(batch)
+
+        # Optional: Get vector database information
+        entity_ids = []
+        entity_vectors = {}
+        if include_vector_data:
+            entity_ids = [
+                compute_mdhash_id(entity_name, prefix="ent-") for entity_name in batch
+            ]
+            entity_vectors = {
+                item["id"]: item
+                for item in await entities_vdb.get_by_ids(entity_ids)
+                if item and "id" in item
+            }
+
+        for i, entity_name in enumerate(batch):
+            node_data = nodes.get(entity_name)
+            entity_row = {
+                "entity_name": entity_name,
+                "source_id": node_data.get("source_id") if node_data else None,
+                "graph_data": _export_json(node_data),
+            }
+            if include_vector_data:
+                entity_row["vector_data"] = _export_json(
+                    entity_vectors.get(entity_ids[i])
+                )
+            yield entity_row
+
+
+async def _iter_relation_rows(
+    chunk_entity_relation_graph, relationships_vdb, include_vector_data: bool
+):
+    """Yield export rows for graph relations, one per undirected edge"""
+    # One bulk read instead of probing every ordered entity pair. Some backends
+    # report an undirected edge in both directions, so keep the first orientation.
+    all_edges = await chunk_entity_relation_graph.get_all_edges()
+    seen_edges = set()
+    edges = []
+    for edge in all_edges:
+        src_entity, tgt_entity = edge.get("source"), edge.get("target")
+        if src_entity == tgt_entity:
+            continue
+        edge_key = frozenset((src_entity, tgt_entity))
+        if edge_key in seen_edges:
+            continue
+        seen_edges.add(edge_key)
+        edge_data = {k: v for k, v in edge.items() if k not in ("source", "target")}
+        edges.append((src_entity, tgt_entity, edge_data))
+    del all_edges, seen_edges
+
+    for start in range(0, len(edges), _EXPORT_BATCH_SIZE):
+        batch = edges[start : start + _EXPORT_BATCH_SIZE]
+
+        # Optional: Get vector database information. The relation id depends on
+        # the orientation it was stored with, so look up both.
+        rel_id_pairs = []
+        relation_vectors = {}
+        if include_vector_data:
+            rel_id_pairs = [
+                (
+                    compute_mdhash_id(src_entity + tgt_entity, prefix="rel-"),
+                    compute_mdhash_id(tgt_entity + src_entity, prefix="rel-"),
+                )
+                for src_entity, tgt_entity, _ in batch
+            ]
+            relation_vectors = {
+                item["id"]: item
+                for item in await relationships_vdb.get_by_ids(
+                    [rel_id for pair in rel_id_pairs for rel_id in pair]
+                )
+                if item and "id" in item
+            }
+
+        for i, (src_entity, tgt_entity, edge_data) in enumerate(batch):
+            relation_row = {
+                "src_entity": src_entity,
+                "tgt_entity": tgt_entity,
+                "source_id": edge_data.get("source_id"),
+                "graph_data": _export_json(edge_data),
+            }
+            if include_vector_data:
+                forward_id, reverse_id = rel_id_pairs[i]
+                vector_data = relation_vectors.get(forward_id)
+                if vector_data is None:
+                    vector_data = relation_vectors.get(reverse_id)
+                relation_row["vector_data"] = _export_json(vector_data)
+            yield relation_row
+
+
+async def _iter_relationship_rows(relationships_vdb):
+    """Yield export rows for the relationships stored in the vector database"""
+    all_relationships = await relationships_vdb.client_storage
+    for rel in all_relationships["data"]:
+        yield {
+            "relationship_id": rel["__id__"],
+            "data": _export_json(rel),
+        }
+
+
+async def _write_csv_section(csvfile, title: str, rows, trailer: str = "") -> None:
+    """Stream rows into a CSV section; nothing is written when there are no rows"""
+    writer = None
+    batch = []
+    async for row in rows:
+        if writer is None:
+            csvfile.write(f"# {title}\n")
+            writer = csv.DictWriter(csvfile, fieldnames=row.keys())
+            writer.writeheader()
+        batch.append(row)
+        if len(batch) >= _EXPORT_BATCH_SIZE:
+            # Serialize and write off the event loop
+            await asyncio.to_thread(writer.writerows, batch)
+            batch = []
+    if batch:
+        await asyncio.to_thread(writer.writerows, batch)
+    if writer is not None:
+        csvfile.write(trailer)
+
+
+async def _write_md_section(
+    mdfile, title: str, rows, empty_message: str, trailer: str = ""
+) -> None:
+    """Stream rows into a Markdown table section"""
+    mdfile.write(f"## {title}\n\n")
+    has_rows = False
+    lines = []
+    async for row in rows:
+        if not has_rows:
+            has_rows = True
+            # Write header
+            mdfile.write("| " + " | ".join(row.keys()) + " |\n")
+            mdfile.write("| " + " | ".join(["---"] * len(row)) + " |\n")
+        lines.append("| " + " | ".join(str(v) for v in row.values()) + " |\n")
+        if len(lines) >= _EXPORT_BATCH_SIZE:
+            # Write off the event loop
+            await asyncio.to_thread(mdfile.writelines, lines)
+            lines = []
+    if lines:
+        await asyncio.to_thread(mdfile.writelines, lines)
+    if has_rows:
+        mdfile.write(trailer)
+    else:
+        mdfile.write(f"*{empty_message}*\n\n")
+
+
+def _write_txt_section(
+    txtfile, title: str, rows: list[dict], empty_message: str, trailer: str = ""
+) -> None:
+    """Write rows as a fixed-width text table"""
+    txtfile.write(f"{title}\n")
+    txtfile.write("-" * 80 + "\n")
+    if not rows:
+        txtfile.write(f"{empty_message}\n\n")
+        return
+
+    # Stringify each cell once and find the column widths in the same pass
+    str_rows = [{k: str(v) for k, v in row.items()} for row in rows]
+    col_widths = {k: len(k) for k in str_rows[0]}
+    for row in str_rows:
+        for k, v in row.items():
+            if len(v) > col_widths[k]:
+                col_widths[k] = len(v)
+    header = "  ".join(k.ljust(col_widths[k]) for k in str_rows[0])
+    txtfile.write(header + "\n")
+    txtfile.write("-" * len(header) + "\n")
+
+    # Write rows
+    for row in str_rows:
+        line = "  ".join(v.ljust(col_widths[k]) for k, v in row.items())
+        txtfile.write(line + "\n")
+    txtfile.write(trailer)
+
+
+def _write_txt_export(
+    output_path: str,
+    entities_data: list[dict],
+    relations_data: list[dict],
+    relationships_data: list[dict],
+) -> None:
+    with open(output_path, "w", encoding="utf-8") as txtfile:
+        txtfile.write("LIGHTRAG DATA EXPORT\n")
+        txtfile.write("=" * 80 + "\n\n")
+        _write_txt_section(
+            txtfile, "ENTITIES", entities_data, "No entity data available", "\n\n"
+        )
+        _write_txt_section(
+            txtfile, "RELATIONS", relations_data, "No relation data available", "\n\n"
+        )
+        _write_txt_section(
+            txtfile,
+            "RELATIONSHIPS",
+            relationships_data,
+            "No relationship data available",
+        )
+
+
+def _write_excel(
+    output_path: str,
+    entities_data: list[dict],
+    relations_data: list[dict],
+    relationships_data: list[dict],
+) -> None:
+    import pandas as pd
+
+    entities_df = pd.DataFrame(entities_data) if entities_data else pd.DataFrame()
+    relations_df = pd.DataFrame(relations_data) if relations_data else pd.DataFrame()
+    relationships_df = (
+        pd.DataFrame(relationships_data) if relationships_data else pd.DataFrame()
+    )
+
+    with pd.ExcelWriter(output_path, engine="xlsxwriter") as writer:
+        if not entities_df.empty:
+            entities_df.to_excel(writer, sheet_name="Entities", index=False)
+        if not relations_df.empty:
+            relations_df.to_excel(writer, sheet_name="Relations", index=False)
+        if not relationships_df.empty:
+            relationships_df.to_excel(writer, sheet_name="Relationships", index=False)
 
 
 async def aexport_data(
@@ -981,281 +1707,70 @@ async def aexport_data(
             - txt: Plain text formatted output
         include_vector_data: Whether to include data from the vector database.
     """
-    # Collect data
-    entities_data = []
-    relations_data = []
-    relationships_data = []
-
-    # --- Entities ---
-    all_entities = await chunk_entity_relation_graph.get_all_labels()
-    for entity_name in all_entities:
-        # Get entity information from graph
-        node_data = await chunk_entity_relation_graph.get_node(entity_name)
-        source_id = node_data.get("source_id") if node_data else None
-
-        entity_info = {
-            "graph_data": node_data,
-            "source_id": source_id,
-        }
-
-        # Optional: Get vector database information
-        if include_vector_data:
-            entity_id = compute_mdhash_id(entity_name, prefix="ent-")
-            vector_data = await entities_vdb.get_by_id(entity_id)
-            entity_info["vector_data"] = vector_data
-
-        entity_row = {
-            "entity_name": entity_name,
-            "source_id": source_id,
-            "graph_data": str(
-                entity_info["graph_data"]
-            ),  # Convert to string to ensure compatibility
-        }
-        if include_vector_data and "vector_data" in entity_info:
-            entity_row["vector_data"] = str(entity_info["vector_data"])
-        entities_data.append(entity_row)
-
-    # --- Relations ---
-    for src_entity in all_entities:
-        for tgt_entity in all_entities:
-            if src_entity == tgt_entity:
-                continue
-
-            edge_exists = await chunk_entity_relation_graph.has_edge(
-                src_entity, tgt_entity
-            )
-            if edge_exists:
-                # Get edge information from graph
-                edge_data = await chunk_entity_relation_graph.get_edge(
-                    src_entity, tgt_entity
-                )
-                source_id = edge_data.get("source_id") if edge_data else None
-
-                relation_info = {
-                    "graph_data": edge_data,
-                    "source_id": source_id,
-                }
-
-                # Optional: Get vector database information
-                if include_vector_data:
-                    rel_id = compute_mdhash_id(src_entity + tgt_entity, prefix="rel-")
-                    vector_data = await relationships_vdb.get_by_id(rel_id)
-                    relation_info["vector_data"] = vector_data
-
-                relation_row = {
-                    "src_entity": src_entity,
-                    "tgt_entity": tgt_entity,
-                    "source_id": relation_info["source_id"],
-                    "graph_data": str(relation_info["graph_data"]),  # Convert to string
-                }
-                if include_vector_data and "vector_data" in relation_info:
-                    relation_row["vector_data"] = str(relation_info["vector_data"])
-                relations_data.append(relation_row)
-
-    # --- Relationships (from VectorDB) ---
-    all_relationships = await relationships_vdb.client_storage
-    for rel in all_relationships["data"]:
-        relationships_data.append(
-            {
-                "relationship_id": rel["__id__"],
-                "data": str(rel),  # Convert to string for compatibility
-            }
+    if file_format not in ("csv", "excel", "md", "txt"):
+        raise ValueError(
+            f"Unsupported file format: {file_format}. "
+            f"Choose from: csv, excel, md, txt"
         )
 
-    # Export based on format
+    # Rows are produced lazily; csv and md stream them straight into the file
+    entity_rows = _iter_entity_rows(
+        chunk_entity_relation_graph, entities_vdb, include_vector_data
+    )
+    relation_rows = _iter_relation_rows(
+        chunk_entity_relation_graph, relationships_vdb, include_vector_data
+    )
+    relationship_rows = _iter_relationship_rows(relationships_vdb)
+
     if file_format == "csv":
         # CSV export
         with open(output_path, "w", newline="", encoding="utf-8") as csvfile:
-            # Entities
-            if entities_data:
-                csvfile.write("# ENTITIES\n")
-                writer = csv.DictWriter(csvfile, fieldnames=entities_data[0].keys())
-                writer.writeheader()
-                writer.writerows(entities_data)
-                csvfile.write("\n\n")
-
-            # Relations
-            if relations_data:
-                csvfile.write("# RELATIONS\n")
-                writer = csv.DictWriter(csvfile, fieldnames=relations_data[0].keys())
-                writer.writeheader()
-                writer.writerows(relations_data)
-                csvfile.write("\n\n")
-
-            # Relationships
-            if relationships_data:
-                csvfile.write("# RELATIONSHIPS\n")
-                writer = csv.DictWriter(
-                    csvfile, fieldnames=relationships_data[0].keys()
-                )
-                writer.writeheader()
-                writer.writerows(relationships_data)
+            await _write_csv_section(csvfile, "ENTITIES", entity_rows, "\n\n")
+            await _write_csv_section(csvfile, "RELATIONS", relation_rows, "\n\n")
+            await _write_csv_section(csvfile, "RELATIONSHIPS", relationship_rows)
 
     elif file_format == "excel":
         # Excel export
-        import pandas as pd
+        entities_data = [row async for row in entity_rows]
+        relations_data = [row async for row in relation_rows]
+        relationships_data = [row async for row in relationship_rows]
 
-        entities_df = pd.DataFrame(entities_data) if entities_data else pd.DataFrame()
-        relations_df = (
-            pd.DataFrame(relations_data) if relations_data else pd.DataFrame()
-        )
-        relationships_df = (
-            pd.DataFrame(relationships_data) if relationships_data else pd.DataFrame()
+        # DataFrame building and xlsxwriter are CPU-bound; keep them off the event loop
+        await asyncio.to_thread(
+            _write_excel, output_path, entities_data, relations_data, relationships_data
         )
 
-        with pd.ExcelWriter(output_path, engine="xlsxwriter") as writer:
-            if not entities_df.empty:
-                entities_df.to_excel(writer, sheet_name="Entities", index=False)
-            if not relations_df.empty:
-                relations_df.to_excel(writer, sheet_name="Relations", index=False)
-            if not relationships_df.empty:
-                relationships_df.to_excel(
-                    writer, sheet_name="Relationships", index=False
-                )
-
     elif file_format == "md":
         # Markdown export
         with open(output_path, "w", encoding="utf-8") as mdfile:
             mdfile.write("# LightRAG Data Export\n\n")
-
-            # Entities
-            mdfile.write("## Entities\n\n")
-            if entities_data:
-                # Write header
-                mdfile.write("| " + " | ".join(entities_data[0].keys()) + " |\n")
-                mdfile.write(
-                    "| " + " | ".join(["---"] * len(entities_data[0].keys())) + " |\n"
-                )
-
-                # Write rows
-                for entity in entities_data:
-                    mdfile.write(
-                        "| " + " | ".join(str(v) for v in entity.values()) + " |\n"
-                    )
-                mdfile.write("\n\n")
-            else:
-                mdfile.write("*No entity data available*\n\n")
-
-            # Relations
-            mdfile.write("## Relations\n\n")
-            if relations_data:
-                # Write header
-                mdfile.write("| " + " | ".join(relations_data[0].keys()) + " |\n")
-                mdfile.write(
-                    "| " + " | ".join(["---"] * len(relations_data[0].keys())) + " |\n"
-                )
-
-                # Write rows
-                for relation in relations_data:
-                    mdfile.write(
-                        "| " + " | ".join(str(v) for v in relation.values()) + " |\n"
-                    )
-                mdfile.write("\n\n")
-            else:
-                mdfile.write("*No relation data available*\n\n")
-
-            # Relationships
-            mdfile.write("## Relationships\n\n")
-            if relationships_data:
-                # Write header
-                mdfile.write("| " + " | ".join(relationships_data[0].keys()) + " |\n")
-                mdfile.write(
-                    "| "
-                    + " | ".join(["---"] * len(relationships_data[0].keys()))
-                    + " |\n"
-                )
-
-                # Write rows
-                for relationship in relationships_data:
-                    mdfile.write(
-                        "| "
-                        + " | ".join(str(v) for v in relationship.values())
-                        + " |\n"
-                    )
-            else:
-                mdfile.write("*No relationship data available*\n\n")
+            await _write_md_section(
+                mdfile, "Entities", entity_rows, "No entity data available", "\n\n"
+            )
+            await _write_md_section(
+                mdfile, "Relations", relation_rows, "No relation data available", "\n\n"
+            )
+            await _write_md_section(
+                mdfile,
+                "Relationships",
+                relationship_rows,
+                "No relationship data available",
+            )
 
     elif file_format == "txt":
-        # Plain text export
-        with open(output_path, "w", encoding="utf-8") as txtfile:
-            txtfile.write("LIGHTRAG DATA EXPORT\n")
-            txtfile.write("=" * 80 + "\n\n")
-
-            # Entities
-            txtfile.write("ENTITIES\n")
-            txtfile.write("-" * 80 + "\n")
-            if entities_data:
-                # Create fixed width columns
-                col_widths = {
-                    k: max(len(k), max(len(str(e[k])) for e in entities_data))
-                    for k in entities_data[0]
-                }
-                header = "  ".join(k.ljust(col_widths[k]) for k in entities_data[0])
-                txtfile.write(header + "\n")
-                txtfile.write("-" * len(header) + "\n")
-
-                # Write rows
-                for entity in entities_data:
-                    row = "  ".join(
-                        str(v).ljust(col_widths[k]) for k, v in entity.items()
-                    )
-                    txtfile.write(row + "\n")
-                txtfile.write("\n\n")
-            else:
-                txtfile.write("No entity data available\n\n")
-
-            # Relations
-            txtfile.write("RELATIONS\n")
-            txtfile.write("-" * 80 + "\n")
-            if relations_data:
-                # Create fixed width columns
-                col_widths = {
-                    k: max(len(k), max(len(str(r[k])) for r in relations_data))
-                    for k in relations_data[0]
-                }
-                header = "  ".join(k.ljust(col_widths[k]) for k in relations_data[0])
-                txtfile.write(header + "\n")
-                txtfile.write("-" * len(header) + "\n")
-
-                # Write rows
-                for relation in relations_data:
-                    row = "  ".join(
-                        str(v).ljust(col_widths[k]) for k, v in relation.items()
-                    )
-                    txtfile.write(row + "\n")
-                txtfile.write("\n\n")
-            else:
-                txtfile.write("No relation data available\n\n")
-
-            # Relationships
-            txtfile.write("RELATIONSHIPS\n")
-            txtfile.write("-" * 80 + "\n")
-            if relationships_data:
-                # Create fixed width columns
-                col_widths = {
-                    k: max(len(k), max(len(str(r[k])) for r in relationships_data))
-                    for k in relationships_data[0]
-                }
-                header = "  ".join(
-                    k.ljust(col_widths[k]) for k in relationships_data[0]
-                )
-                txtfile.write(header + "\n")
-                txtfile.write("-" * len(header) + "\n")
-
-                # Write rows
-                for relationship in relationships_data:
-                    row = "  ".join(
-                        str(v).ljust(col_widths[k]) for k, v in relationship.items()
-                    )
-                    txtfile.write(row + "\n")
-            else:
-                txtfile.write("No relationship data available\n\n")
+        # Plain text export; column widths need every row before writing
+        entities_data = [row async for row in entity_rows]
+        relations_data = [row async for row in relation_rows]
+        relationships_data = [row async for row in relationship_rows]
 
-    else:
-        raise ValueError(
-            f"Unsupported file format: {file_format}. "
-            f"Choose from: csv, excel, md, txt"
+        await asyncio.to_thread(
+            _write_txt_export,
+            output_path,
+            entities_data,
+            relations_data,
+            relationships_data,
         )
+
     if file_format is not None:
         print(f"Data exported to: {output_path} with format: {file_format}")
     else:
@@ -1306,18 +1821,21 @@ def export_data(
 def lazy_external_import(module_name: str, class_name: str) -> Callable[..., Any]:
     """Lazily import a class from an external module based on the package of the caller."""
     # Get the caller's module and package
-    import inspect
-
     caller_frame = inspect.currentframe().f_back
     module = inspect.getmodule(caller_frame)
     package = module.__package__ if module else None
 
+    resolved_cls = None
+
     def import_class(*args: Any, **kwargs: Any):
-        import importlib
+        nonlocal resolved_cls
+        # Resolve the class on first use only
+        if resolved_cls is None:
+            import importlib
 
-        module = importlib.import_module(module_name, package=package)
-        cls = getattr(module, class_name)
-        return cls(*args, **kwargs)
+            module = importlib.import_module(module_name, package=package)
+            resolved_cls = getattr(module, class_name)
+        return resolved_cls(*args, **kwargs)
 
     return import_class
 
@@ -1343,15 +1861,17 @@ async def update_chunk_cache_list(
         chunk_data = await text_chunks_storage.get_by_id(chunk_id)
         if chunk_data:
             # Ensure llm_cache_list exists
-            if "llm_cache_list" not in chunk_data:
-                chunk_data["llm_cache_list"] = []
+            existing_keys = chunk_data.setdefault("llm_cache_list", [])
 
-            # Add cache keys to the list if not already present
-            existing_keys = set(chunk_data["llm_cache_list"])
-            new_keys = [key for key in cache_keys if key not in existing_keys]
+            # Add cache keys to the list if not already present; short lists are
+            # scanned directly rather than paying for a set build
+            existing_lookup = (
+                set(existing_keys) if len(existing_keys) > 32 else existing_keys
+            )
+            new_keys = [key for key in cache_keys if key not in existing_lookup]
 
             if new_keys:
-                chunk_data["llm_cache_list"].extend(new_keys)
+                existing_keys.extend(new_keys)
 
                 # Update the chunk in storage
                 await text_chunks_storage.upsert({chunk_id: chunk_data})
@@ -1364,9 +1884,31 @@ async def update_chunk_cache_list(
         )
 
 
+_THINK_RE = re.compile(r"^(<think>.*?</think>|<think>)", re.DOTALL)
+
+
 def remove_think_tags(text: str) -> str:
     """Remove <think> tags from the text"""
-    return re.sub(r"^(<think>.*?</think>|<think>)", "", text, flags=re.DOTALL).strip()
+    # The pattern is anchored, so only text starting with the tag can match
+    if not text.startswith("<think>"):
+        return text.strip()
+    return _THINK_RE.sub("", text, count=1).strip()
+
+
+@lru_cache(maxsize=128)
+def _serialize_history_items(history_items: tuple) -> str:
+    return json.dumps([dict(items) for items in history_items], ensure_ascii=False)
+
+
+def _serialize_history(history_messages: list[dict[str, str]]) -> str:
+    """JSON-encode history messages, reusing the result for repeated histories"""
+    try:
+        return _serialize_history_items(
+            tuple(tuple(message.items()) for message in history_messages)
+        )
+    except TypeError:
+        # Unhashable content (e.g. multimodal message parts)
+        return json.dumps(history_messages, ensure_ascii=False)
 
 
 async def use_llm_func_with_cache(
@@ -1400,7 +1942,7 @@ async def use_llm_func_with_cache(
     """
     if llm_response_cache:
         if history_messages:
-            history = json.dumps(history_messages, ensure_ascii=False)
+            history = _serialize_history(history_messages)
             _prompt = history + "\n" + input_text
         else:
             _prompt = input_text
@@ -1477,12 +2019,36 @@ def get_content_summary(content: str, max_length: int = 250) -> str:
     Returns:
         Truncated content with ellipsis if needed
     """
+    if len(content) > max_length + 64:
+        # Large document: decide from a bounded prefix instead of stripping it all
+        head = content[: max_length + 64].lstrip()
+        tail = head[max_length:]
+        if tail and not tail.isspace():
+            return head[:max_length] + "..."
+
     content = content.strip()
     if len(content) <= max_length:
         return content
     return content[:max_length] + "..."
 
 
+# Patterns and tables for normalize_extracted_info, compiled once at import
+# (?<=[\u4e00-\u9fa5]): Positive lookbehind for Chinese character
+# \s+: One or more whitespace characters
+# (?=[\u4e00-\u9fa5]): Positive lookahead for Chinese character
+_RE_CJK_SPACE_CJK = re.compile(r"(?<=[\u4e00-\u9fa5])\s+(?=[\u4e00-\u9fa5])")
+_RE_CJK_SPACE_ASCII = re.compile(
+    r"(?<=[\u4e00-\u9fa5])\s+(?=[a-zA-Z0-9\(\)\[\]@#$%!&\*\-=+_])"
+)
+_RE_ASCII_SPACE_CJK = re.compile(
+    r"(?<=[a-zA-Z0-9\(\)\[\]@#$%!&\*\-=+_])\s+(?=[\u4e00-\u9fa5])"
+)
+_RE_QUOTE_BEFORE_CJK = re.compile(r"['\"]+(?=[\u4e00-\u9fa5])")
+_RE_QUOTE_AFTER_CJK = re.compile(r"(?<=[\u4e00-\u9fa5])['\"]+")
+_NORMALIZE_PUNCT_TABLE = str.maketrans({"（": "(", "）": ")", "—": "-", "－": "-"})
+_CHINESE_QUOTES_TABLE = str.maketrans("", "", "“”‘’")
+
+
 def normalize_extracted_info(name: str, is_entity=False) -> str:
     """Normalize entity/relation names and description with the following rules:
     1. Remove spaces between Chinese characters
@@ -1500,26 +2066,15 @@ def normalize_extracted_info(name: str, is_entity=False) -> str:
     Returns:
         Normalized entity name
     """
-    # Replace Chinese parentheses with English parentheses
-    name = name.replace("（", "(").replace("）", ")")
+    # Replace Chinese parentheses and dashes with English ones
+    name = name.translate(_NORMALIZE_PUNCT_TABLE)
 
-    # Replace Chinese dash with English dash
-    name = name.replace("—", "-").replace("－", "-")
-
-    # Use regex to remove spaces between Chinese characters
-    # Regex explanation:
-    # (?<=[\u4e00-\u9fa5]): Positive lookbehind for Chinese character
-    # \s+: One or more whitespace characters
-    # (?=[\u4e00-\u9fa5]): Positive lookahead for Chinese character
-    name = re.sub(r"(?<=[\u4e00-\u9fa5])\s+(?=[\u4e00-\u9fa5])", "", name)
+    # Remove spaces between Chinese characters
+    name = _RE_CJK_SPACE_CJK.sub("", name)
 
     # Remove spaces between Chinese and English/numbers/symbols
-    name = re.sub(
-        r"(?<=[\u4e00-\u9fa5])\s+(?=[a-zA-Z0-9\(\)\[\]@#$%!&\*\-=+_])", "", name
-    )
-    name = re.sub(
-        r"(?<=[a-zA-Z0-9\(\)\[\]@#$%!&\*\-=+_])\s+(?=[\u4e00-\u9fa5])", "", name
-    )
+    name = _RE_CJK_SPACE_ASCII.sub("", name)
+    name = _RE_ASCII_SPACE_CJK.sub("", name)
 
     # Remove English quotation marks from the beginning and end
     if len(name) >= 2 and name.startswith('"') and name.endswith('"'):
@@ -1529,14 +2084,55 @@ def normalize_extracted_info(name: str, is_entity=False) -> str:
 
     if is_entity:
         # remove Chinese quotes
-        name = name.replace("“", "").replace("”", "").replace("‘", "").replace("’", "")
+        name = name.translate(_CHINESE_QUOTES_TABLE)
         # remove English queotes in and around chinese
-        name = re.sub(r"['\"]+(?=[\u4e00-\u9fa5])", "", name)
-        name = re.sub(r"(?<=[\u4e00-\u9fa5])['\"]+", "", name)
+        name = _RE_QUOTE_BEFORE_CJK.sub("", name)
+        name = _RE_QUOTE_AFTER_CJK.sub("", name)
 
     return name
 
 
+# Separator for normalize_extracted_info_batch. It is neither whitespace (unlike
+# \x1f, which \s matches) nor part of any lookaround class, so no pattern can
+# match across two names.
+_NORMALIZE_BATCH_SEP = "\x00"
+
+
+def normalize_extracted_info_batch(names: list[str], is_entity=False) -> list[str]:
+    """Apply normalize_extracted_info to many names, running each regex once over all of them
+
+    Returns:
+        Normalized names, in the same order as the input
+    """
+    if len(names) < 2 or any(_NORMALIZE_BATCH_SEP in name for name in names):
+        return [normalize_extracted_info(name, is_entity) for name in names]
+
+    joined = _NORMALIZE_BATCH_SEP.join(names).translate(_NORMALIZE_PUNCT_TABLE)
+    joined = _RE_CJK_SPACE_CJK.sub("", joined)
+    joined = _RE_CJK_SPACE_ASCII.sub("", joined)
+    joined = _RE_ASCII_SPACE_CJK.sub("", joined)
+
+    # Quote stripping depends on each name's own start and end
+    results = joined.split(_NORMALIZE_BATCH_SEP)
+    for i, name in enumerate(results):
+        if len(name) >= 2 and name.startswith('"') and name.endswith('"'):
+            name = name[1:-1]
+        if len(name) >= 2 and name.startswith("'") and name.endswith("'"):
+            name = name[1:-1]
+        results[i] = name
+
+    if is_entity:
+        joined = _NORMALIZE_BATCH_SEP.join(results).translate(_CHINESE_QUOTES_TABLE)
+        joined = _RE_QUOTE_BEFORE_CJK.sub("", joined)
+        joined = _RE_QUOTE_AFTER_CJK.sub("", joined)
+        results = joined.split(_NORMALIZE_BATCH_SEP)
+
+    return results
+
+
+_NULL_DELETE_TABLE = str.maketrans("", "", "\x00")
+
+
 def clean_text(text: str) -> str:
     """Clean text by removing null bytes (0x00) and whitespace
 
@@ -1546,7 +2142,17 @@ def clean_text(text: str) -> str:
     Returns:
         Cleaned text
     """
-    return text.strip().replace("\x00", "")
+    if "\x00" not in text:
+        return text.strip()
+    return text.strip().translate(_NULL_DELETE_TABLE)
+
+
+@lru_cache(maxsize=None)
+def _storage_env_requirements(storage_name: str) -> tuple[tuple, frozenset]:
+    from lightrag.kg import STORAGE_ENV_REQUIREMENTS
+
+    required_vars = tuple(STORAGE_ENV_REQUIREMENTS.get(storage_name, ()))
+    return required_vars, frozenset(required_vars)
 
 
 def check_storage_env_vars(storage_name: str) -> None:
@@ -1558,11 +2164,11 @@ def check_storage_env_vars(storage_name: str) -> None:
     Raises:
         ValueError: If required environment variables are missing
     """
-    from lightrag.kg import STORAGE_ENV_REQUIREMENTS
+    required_vars, required_set = _storage_env_requirements(storage_name)
+    if not required_set or required_set <= os.environ.keys():
+        return
 
-    required_vars = STORAGE_ENV_REQUIREMENTS.get(storage_name, [])
     missing_vars = [var for var in required_vars if var not in os.environ]
-
     if missing_vars:
         raise ValueError(
             f"Storage implementation '{storage_name}' requires the following "
@@ -1599,24 +2205,24 @@ def linear_gradient_weighted_polling(
         return entity_chunks[:max_related_chunks]
 
     # Calculate expected text chunk count for each position (linear decrease)
-    expected_counts = []
-    for i in range(n):
-        # Linear interpolation: from max_related_chunks to min_related_chunks
-        ratio = i / (n - 1) if n > 1 else 0
-        expected = max_related_chunks - ratio * (
-            max_related_chunks - min_related_chunks
-        )
-        expected_counts.append(int(round(expected)))
+    # Linear interpolation from max_related_chunks to min_related_chunks, using the
+    # same float operations as the scalar formula so ties round (half-to-even) alike
+    ratios = np.arange(n) / (n - 1)
+    expected_counts = (
+        np.rint(max_related_chunks - ratios * (max_related_chunks - min_related_chunks))
+        .astype(np.int64)
+        .tolist()
+    )
 
     # First round allocation: allocate by expected values
+    chunks_ref = [
+        entity_rel.get("sorted_chunks", []) for entity_rel in entities_or_relations
+    ]
     selected_chunks = []
     used_counts = []  # Track number of chunks used by each entity
     total_remaining = 0  # Accumulate remaining quotas
 
-    for i, entity_rel in enumerate(entities_or_relations):
-        entity_chunks = entity_rel.get("sorted_chunks", [])
-        expected = expected_counts[i]
-
+    for entity_chunks, expected in zip(chunks_ref, expected_counts):
         # Actual allocatable count
         actual = min(expected, len(entity_chunks))
         selected_chunks.extend(entity_chunks[:actual])
@@ -1627,25 +2233,20 @@ def linear_gradient_weighted_polling(
         if remaining > 0:
             total_remaining += remaining
 
-    # Second round allocation: multi-round scanning to allocate remaining quotas
-    for _ in range(total_remaining):
-        allocated = False
-
-        # Scan entities one by one, allocate one chunk when finding unused chunks
-        for i, entity_rel in enumerate(entities_or_relations):
-            entity_chunks = entity_rel.get("sorted_chunks", [])
-
-            # Check if there are still unused chunks
-            if used_counts[i] < len(entity_chunks):
-                # Allocate one chunk
-                selected_chunks.append(entity_chunks[used_counts[i]])
-                used_counts[i] += 1
-                allocated = True
-                break
-
-        # If no chunks were allocated in this round, all entities are exhausted
-        if not allocated:
-            break
+    # Second round allocation: each remaining quota goes to the highest-ranked
+    # entity that still has unused chunks. Once an entity is exhausted it stays
+    # exhausted, so a single forward pointer replaces rescanning from the start.
+    i = 0
+    while total_remaining > 0 and i < n:
+        entity_chunks = chunks_ref[i]
+        take = min(total_remaining, len(entity_chunks) - used_counts[i])
+        if take > 0:
+            selected_chunks.extend(
+                entity_chunks[used_counts[i] : used_counts[i] + take]
+            )
+            used_counts[i] += take
+            total_remaining -= take
+        i += 1
 
     return selected_chunks
 
@@ -1653,7 +2254,17 @@ def linear_gradient_weighted_polling(
 class TokenTracker:
     """Track token usage for LLM calls."""
 
+    __slots__ = (
+        "prompt_tokens",
+        "completion_tokens",
+        "total_tokens",
+        "call_count",
+        "_lock",
+    )
+
     def __init__(self):
+        # Trackers may be shared across threads (e.g. sync LLM calls in executors)
+        self._lock = threading.Lock()
         self.reset()
 
     def __enter__(self):
@@ -1664,10 +2275,11 @@ class TokenTracker:
         print(self)
 
     def reset(self):
-        self.prompt_tokens = 0
-        self.completion_tokens = 0
-        self.total_tokens = 0
-        self.call_count = 0
+        with self._lock:
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.total_tokens = 0
+            self.call_count = 0
 
     def add_usage(self, token_counts):
         """Add token usage from one LLM call.
@@ -1675,27 +2287,51 @@ class TokenTracker:
         Args:
             token_counts: A dictionary containing prompt_tokens, completion_tokens, total_tokens
         """
-        self.prompt_tokens += token_counts.get("prompt_tokens", 0)
-        self.completion_tokens += token_counts.get("completion_tokens", 0)
+        prompt = token_counts.get("prompt_tokens", 0)
+        completion = token_counts.get("completion_tokens", 0)
+        total = token_counts.get("total_tokens")
 
         # If total_tokens is provided, use it directly; otherwise calculate the sum
-        if "total_tokens" in token_counts:
-            self.total_tokens += token_counts["total_tokens"]
-        else:
-            self.total_tokens += token_counts.get(
-                "prompt_tokens", 0
-            ) + token_counts.get("completion_tokens", 0)
+        if total is None:
+            total = prompt + completion
+
+        with self._lock:
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+            self.total_tokens += total
+            self.call_count += 1
 
-        self.call_count += 1
+    def add_usage_batch(self, token_counts_list):
+        """Add token usage from several LLM calls with a single lock acquisition.
+
+        Args:
+            token_counts_list: An iterable of dictionaries accepted by add_usage
+        """
+        prompt_sum = completion_sum = total_sum = calls = 0
+        for token_counts in token_counts_list:
+            prompt = token_counts.get("prompt_tokens", 0)
+            completion = token_counts.get("completion_tokens", 0)
+            total = token_counts.get("total_tokens")
+            prompt_sum += prompt
+            completion_sum += completion
+            total_sum += total if total is not None else prompt + completion
+            calls += 1
+
+        with self._lock:
+            self.prompt_tokens += prompt_sum
+            self.completion_tokens += completion_sum
+            self.total_tokens += total_sum
+            self.call_count += calls
 
     def get_usage(self):
         """Get current usage statistics."""
-        return {
-            "prompt_tokens": self.prompt_tokens,
-            "completion_tokens": self.completion_tokens,
-            "total_tokens": self.total_tokens,
-            "call_count": self.call_count,
-        }
+        with self._lock:
+            return {
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.total_tokens,
+                "call_count": self.call_count,
+            }
 
     def __str__(self):
         usage = self.get_usage()
@@ -1707,6 +2343,73 @@ class TokenTracker:
         )
 
 
+async def _call_rerank_func(rerank_func, **kwargs) -> list[dict]:
+    """Await an async rerank function, or run a sync one in a worker thread"""
+    if inspect.iscoroutinefunction(rerank_func):
+        return await rerank_func(**kwargs)
+    result = await asyncio.to_thread(rerank_func, **kwargs)
+    # Callable objects with an async __call__ are not detected as coroutine functions
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+
+# Opt-in (enable_rerank_cache) LRU of rerank results, keyed by rerank function, query,
+# top_n and the set of input documents. Only document keys and scores are stored.
+_RERANK_CACHE_MAX = 1024
+_rerank_cache: OrderedDict[tuple, list[tuple[Any, Any]]] = OrderedDict()
+
+
+def _rerank_doc_key(doc) -> str:
+    if not isinstance(doc, dict):
+        return str(doc)
+    doc_id = doc.get("chunk_id") or doc.get("id")
+    if doc_id:
+        return doc_id
+    content = doc.get("content") or doc.get("text") or ""
+    return blake2b(content.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def _store_rerank_result(cache_key: tuple, doc_keys: list, reranked_docs: list) -> None:
+    input_keys = set(doc_keys)
+    # Duplicate inputs or results that cannot be mapped back are not cached
+    if len(input_keys) != len(doc_keys):
+        return
+    entries = []
+    for doc in reranked_docs:
+        doc_key = _rerank_doc_key(doc)
+        if doc_key not in input_keys:
+            return
+        entries.append(
+            (doc_key, doc.get("rerank_score") if isinstance(doc, dict) else None)
+        )
+    _rerank_cache[cache_key] = entries
+    _rerank_cache.move_to_end(cache_key)
+    while len(_rerank_cache) > _RERANK_CACHE_MAX:
+        _rerank_cache.popitem(last=False)
+
+
+def clear_rerank_cache() -> None:
+    """Drop all cached rerank results"""
+    _rerank_cache.clear()
+
+
+_rerank_overflow_warned = False
+
+
+def _trim_rerank_result(reranked_docs, retrieved_docs, top_n: int) -> list[dict]:
+    global _rerank_overflow_warned
+    # Rerankers fall back to returning the input list itself, nothing to report
+    if reranked_docs is not retrieved_docs and not _rerank_overflow_warned:
+        _rerank_overflow_warned = True
+        logger.warning(
+            f"rerank_model_func returned {len(reranked_docs)} results for top_n={top_n}; "
+            "extra results are dropped"
+        )
+    # Slice rather than truncate in place: the list may be cached by the reranker
+    return reranked_docs[:top_n]
+
+
 async def apply_rerank_if_enabled(
     query: str,
     retrieved_docs: list[dict],
@@ -1727,121 +2430,213 @@ async def apply_rerank_if_enabled(
     Returns:
         Reranked documents if rerank is enabled, otherwise original documents
     """
+    return (
+        await _rerank_with_scores(
+            query, retrieved_docs, global_config, enable_rerank, top_n
+        )
+    )[0]
+
+
+def _rerank_scores(global_config: dict, scores) -> np.ndarray | None:
+    # Scores are only needed downstream when min_rerank_score filtering applies
+    if global_config.get("min_rerank_score", 0.5) <= 0.0:
+        return None
+    return np.fromiter(
+        (1.0 if score is None else score for score in scores), dtype=np.float64
+    )
+
+
+async def _rerank_with_scores(
+    query: str,
+    retrieved_docs: list[dict],
+    global_config: dict,
+    enable_rerank: bool = True,
+    top_n: int = None,
+) -> tuple[list[dict], np.ndarray | None]:
+    """apply_rerank_if_enabled that also returns the rerank_score of each result
+
+    The scores are None when no rerank happened or no min_rerank_score is set.
+    """
     if not enable_rerank or not retrieved_docs:
-        return retrieved_docs
+        return retrieved_docs, None
 
     rerank_func = global_config.get("rerank_model_func")
     if not rerank_func:
         logger.warning(
             "Rerank is enabled but no rerank model is configured. Please set up a rerank model or set enable_rerank=False in query parameters."
         )
-        return retrieved_docs
+        return retrieved_docs, None
+
+    # Opt-in: a list that already fits in top_n is only reordered, so skip the
+    # model call when scores are not needed for min_rerank_score filtering. The
+    # order still decides which chunks survive token truncation, hence off by default
+    if (
+        global_config.get("skip_rerank_small", False)
+        and top_n
+        and len(retrieved_docs) <= top_n
+        and global_config.get("min_rerank_score", 0.5) <= 0.0
+    ):
+        return retrieved_docs, None
+
+    cache_key = None
+    if global_config.get("enable_rerank_cache", False):
+        doc_keys = [_rerank_doc_key(doc) for doc in retrieved_docs]
+        cache_key = (rerank_func, query, top_n, tuple(sorted(doc_keys)))
+        cached = _rerank_cache.get(cache_key)
+        if cached is not None:
+            _rerank_cache.move_to_end(cache_key)
+            docs_by_key = dict(zip(doc_keys, retrieved_docs))
+            reranked_docs = []
+            for doc_key, score in cached:
+                doc = docs_by_key[doc_key].copy()
+                if score is not None:
+                    doc["rerank_score"] = score
+                reranked_docs.append(doc)
+            logger.info(f"Rerank cache hit: {len(retrieved_docs)} chunks")
+            return reranked_docs, _rerank_scores(
+                global_config, (score for _, score in cached)
+            )
 
     try:
         # Apply reranking - let rerank_model_func handle top_k internally
-        reranked_docs = await rerank_func(
+        reranked_docs = await _call_rerank_func(
+            rerank_func,
             query=query,
             documents=retrieved_docs,
             top_n=top_n,
         )
         if reranked_docs and len(reranked_docs) > 0:
-            if len(reranked_docs) > top_n:
-                reranked_docs = reranked_docs[:top_n]
+            if top_n is not None and len(reranked_docs) > top_n:
+                reranked_docs = _trim_rerank_result(
+                    reranked_docs, retrieved_docs, top_n
+                )
+            if cache_key is not None:
+                _store_rerank_result(cache_key, doc_keys, reranked_docs)
             logger.info(f"Successfully reranked: {len(retrieved_docs)} chunks")
-            return reranked_docs
+            return reranked_docs, _rerank_scores(
+                global_config,
+                (doc.get("rerank_score", 1.0) for doc in reranked_docs),
+            )
         else:
             logger.warning("Rerank returned empty results, using original chunks")
-            return retrieved_docs
+            return retrieved_docs, None
 
     except Exception as e:
         logger.error(f"Error during reranking: {e}, using original chunks")
-        return retrieved_docs
+        return retrieved_docs, None
 
 
-async def process_chunks_unified(
+async def _process_chunks_with_rerank(
     query: str,
     unique_chunks: list[dict],
     query_param: "QueryParam",
     global_config: dict,
-    source_type: str = "mixed",
-    chunk_token_limit: int = None,  # Add parameter for dynamic token limit
+    source_type: str,
+    chunk_token_limit: int | None,
 ) -> list[dict]:
-    """
-    Unified processing for text chunks: deduplication, chunk_top_k limiting, reranking, and token truncation.
-
-    Args:
-        query: Search query for reranking
-        chunks: List of text chunks to process
-        query_param: Query parameters containing configuration
-        global_config: Global configuration dictionary
-        source_type: Source type for logging ("vector", "entity", "relationship", "mixed")
-        chunk_token_limit: Dynamic token limit for chunks (if None, uses default)
-
-    Returns:
-        Processed and filtered list of text chunks
-    """
-    if not unique_chunks:
-        return []
-
-    origin_count = len(unique_chunks)
-
-    # 1. Apply reranking if enabled and query is provided
-    if query_param.enable_rerank and query and unique_chunks:
-        rerank_top_k = query_param.chunk_top_k or len(unique_chunks)
-        unique_chunks = await apply_rerank_if_enabled(
+    """Steps 1-2 of process_chunks_unified: rerank and min score filtering"""
+    # n tracks len(unique_chunks) and is updated whenever the list is replaced
+    origin_count = n = len(unique_chunks)
+    chunk_top_k = query_param.chunk_top_k
+    scores = None
+
+    # 1. Apply reranking if query is provided
+    if query:
+        rerank_top_k = chunk_top_k or n
+        unique_chunks, scores = await _rerank_with_scores(
             query=query,
             retrieved_docs=unique_chunks,
             global_config=global_config,
-            enable_rerank=query_param.enable_rerank,
+            enable_rerank=True,
             top_n=rerank_top_k,
         )
+        n = len(unique_chunks)
+
+    # 2. Filter by minimum rerank score
+    min_rerank_score = global_config.get("min_rerank_score", 0.5)
+    if n and min_rerank_score > 0.0:
+        original_count = n
 
-    # 2. Filter by minimum rerank score if reranking is enabled
-    if query_param.enable_rerank and unique_chunks:
-        min_rerank_score = global_config.get("min_rerank_score", 0.5)
-        if min_rerank_score > 0.0:
-            original_count = len(unique_chunks)
-
-            # Filter chunks with score below threshold
-            filtered_chunks = []
-            for chunk in unique_chunks:
-                rerank_score = chunk.get(
-                    "rerank_score", 1.0
-                )  # Default to 1.0 if no score
-                if rerank_score >= min_rerank_score:
-                    filtered_chunks.append(chunk)
-
-            unique_chunks = filtered_chunks
-            filtered_count = original_count - len(unique_chunks)
-
-            if filtered_count > 0:
-                logger.info(
-                    f"Rerank filtering: {len(unique_chunks)} chunks remained (min rerank score: {min_rerank_score})"
+        # Rerankers return results best first, so a passing tail means every
+        # chunk passes and the scan can be skipped
+        if scores is not None:
+            tail_score = scores[-1]
+        else:
+            tail_score = unique_chunks[-1].get("rerank_score", 1.0)
+        tail_passes = (
+            global_config.get("rerank_results_sorted", True)
+            and tail_score >= min_rerank_score
+        )
+        if not tail_passes:
+            # Filter chunks with score below threshold (default to 1.0 if no score)
+            if scores is None:
+                scores = np.fromiter(
+                    (chunk.get("rerank_score", 1.0) for chunk in unique_chunks),
+                    dtype=np.float64,
+                    count=original_count,
                 )
-            if not unique_chunks:
-                return []
+            kept = np.flatnonzero(scores >= min_rerank_score)
+            kept_count = len(kept)
+            # Fold the chunk_top_k slice of step 3 into the same list rebuild
+            if chunk_top_k is not None and chunk_top_k > 0:
+                kept = kept[:chunk_top_k]
+            if len(kept) < n:
+                unique_chunks = [unique_chunks[i] for i in kept.tolist()]
+                n = len(unique_chunks)
+        else:
+            kept_count = n
+        filtered_count = original_count - kept_count
+
+        if filtered_count > 0:
+            logger.info(
+                f"Rerank filtering: {kept_count} chunks remained (min rerank score: {min_rerank_score})"
+            )
+        if not n:
+            return []
+
+    return _process_chunks_no_rerank(
+        unique_chunks,
+        query_param,
+        global_config,
+        source_type,
+        chunk_token_limit,
+        origin_count,
+    )
+
+
+def _process_chunks_no_rerank(
+    unique_chunks: list[dict],
+    query_param: "QueryParam",
+    global_config: dict,
+    source_type: str,
+    chunk_token_limit: int | None,
+    origin_count: int,
+) -> list[dict]:
+    """Steps 3-4 of process_chunks_unified: chunk_top_k limiting and token truncation"""
+    n = len(unique_chunks)
+    chunk_top_k = query_param.chunk_top_k
 
     # 3. Apply chunk_top_k limiting if specified
-    if query_param.chunk_top_k is not None and query_param.chunk_top_k > 0:
-        if len(unique_chunks) > query_param.chunk_top_k:
-            unique_chunks = unique_chunks[: query_param.chunk_top_k]
+    if chunk_top_k is not None and chunk_top_k > 0:
+        if n > chunk_top_k:
+            unique_chunks = unique_chunks[:chunk_top_k]
+            n = chunk_top_k
         logger.debug(
-            f"Kept chunk_top-k: {len(unique_chunks)} chunks (deduplicated original: {origin_count})"
+            f"Kept chunk_top-k: {n} chunks (deduplicated original: {origin_count})"
         )
 
     # 4. Token-based final truncation
     tokenizer = global_config.get("tokenizer")
-    if tokenizer and unique_chunks:
+    if tokenizer and n:
         # Set default chunk_token_limit if not provided
         if chunk_token_limit is None:
             # Get default from query_param or global_config
-            chunk_token_limit = getattr(
-                query_param,
-                "max_total_tokens",
-                global_config.get("MAX_TOTAL_TOKENS", DEFAULT_MAX_TOTAL_TOKENS),
-            )
+            chunk_token_limit = getattr(query_param, "max_total_tokens", None)
+            if chunk_token_limit is None:
+                chunk_token_limit = global_config.get(
+                    "MAX_TOTAL_TOKENS", DEFAULT_MAX_TOTAL_TOKENS
+                )
 
-        original_count = len(unique_chunks)
         unique_chunks = truncate_list_by_token_size(
             unique_chunks,
             key=lambda x: x.get("content", ""),
@@ -1849,13 +2644,72 @@ async def process_chunks_unified(
             tokenizer=tokenizer,
         )
         logger.debug(
-            f"Token truncation: {len(unique_chunks)} chunks from {original_count} "
+            f"Token truncation: {len(unique_chunks)} chunks from {n} "
             f"(chunk available tokens: {chunk_token_limit}, source: {source_type})"
         )
 
     return unique_chunks
 
 
+async def process_chunks_unified(
+    query: str,
+    unique_chunks: list[dict],
+    query_param: "QueryParam",
+    global_config: dict,
+    source_type: str = "mixed",
+    chunk_token_limit: int = None,  # Add parameter for dynamic token limit
+) -> list[dict]:
+    """
+    Unified processing for text chunks: deduplication, chunk_top_k limiting, reranking, and token truncation.
+
+    Args:
+        query: Search query for reranking
+        chunks: List of text chunks to process
+        query_param: Query parameters containing configuration
+        global_config: Global configuration dictionary
+        source_type: Source type for logging ("vector", "entity", "relationship", "mixed")
+        chunk_token_limit: Dynamic token limit for chunks (if None, uses default)
+
+    Returns:
+        Processed and filtered list of text chunks
+    """
+    if not unique_chunks:
+        return []
+
+    # 0. Deduplicate by chunk id, keeping the first occurrence; chunks without an
+    # id are only collapsed when the same dict appears twice
+    deduped = {}
+    for chunk in unique_chunks:
+        deduped.setdefault(chunk.get("chunk_id") or chunk.get("id") or id(chunk), chunk)
+    if len(deduped) < len(unique_chunks):
+        logger.debug(
+            f"Chunk deduplication: {len(deduped)} chunks from {len(unique_chunks)}"
+        )
+        unique_chunks = list(deduped.values())
+    del deduped
+
+    if query_param.enable_rerank:
+        return await _process_chunks_with_rerank(
+            query,
+            unique_chunks,
+            query_param,
+            global_config,
+            source_type,
+            chunk_token_limit,
+        )
+    return _process_chunks_no_rerank(
+        unique_chunks,
+        query_param,
+        global_config,
+        source_type,
+        chunk_token_limit,
+        len(unique_chunks),
+    )
+
+
+_GRAPH_SEP_LEN = len(GRAPH_FIELD_SEP)
+
+
 def build_file_path(already_file_paths, data_list, target):
     """Build file path string with length limit and deduplication
 
@@ -1867,13 +2721,18 @@ def build_file_path(already_file_paths, data_list, target):
     Returns:
         str: Combined file paths separated by GRAPH_FIELD_SEP
     """
+    # list: filter empty and duplicate values, keep file order in already_file_paths
     # set: deduplication
-    file_paths_set = {fp for fp in already_file_paths if fp}
-
-    # string: filter empty value and keep file order in already_file_paths
-    file_paths = GRAPH_FIELD_SEP.join(fp for fp in already_file_paths if fp)
+    file_paths = []
+    file_paths_set = set()
+    for fp in already_file_paths:
+        if fp and fp not in file_paths_set:
+            file_paths_set.add(fp)
+            file_paths.append(fp)
+    # running length of GRAPH_FIELD_SEP.join(file_paths)
+    total_len = sum(map(len, file_paths)) + max(0, len(file_paths) - 1) * _GRAPH_SEP_LEN
     # ignored file_paths
-    file_paths_ignore = ""
+    ignored_paths = []
     # add file_paths
     for dp in data_list:
         cur_file_path = dp.get("file_path")
@@ -1888,34 +2747,46 @@ def build_file_path(already_file_paths, data_list, target):
         file_paths_set.add(cur_file_path)
 
         # check the length
-        if (
-            len(file_paths) + len(GRAPH_FIELD_SEP + cur_file_path)
-            < DEFAULT_MAX_FILE_PATH_LENGTH
-        ):
+        cur_len = len(cur_file_path)
+        if total_len + _GRAPH_SEP_LEN + cur_len < DEFAULT_MAX_FILE_PATH_LENGTH:
             # append
-            file_paths += (
-                GRAPH_FIELD_SEP + cur_file_path if file_paths else cur_file_path
-            )
+            total_len += cur_len + (_GRAPH_SEP_LEN if file_paths else 0)
+            file_paths.append(cur_file_path)
         else:
             # ignore
-            file_paths_ignore += GRAPH_FIELD_SEP + cur_file_path
+            ignored_paths.append(cur_file_path)
 
+    file_paths_ignore = "".join(GRAPH_FIELD_SEP + fp for fp in ignored_paths)
     if file_paths_ignore:
         logger.warning(
             f"Length of file_path exceeds {target}, ignoring new file: {file_paths_ignore}"
         )
-    return file_paths
+    return GRAPH_FIELD_SEP.join(file_paths)
+
+
+# (epoch second, formatted local time) of the last generated track id
+_track_id_timestamp: tuple[int, str] = (-1, "")
 
 
-def generate_track_id(prefix: str = "upload") -> str:
-    """Generate a unique tracking ID with timestamp and UUID
+def generate_track_id(prefix: str = "upload", compact: bool = False) -> str:
+    """Generate a unique tracking ID with timestamp and random suffix
 
     Args:
         prefix: Prefix for the track ID (e.g., 'upload', 'insert')
+        compact: Use a hex nanosecond timestamp instead of the readable one
 
     Returns:
-        str: Unique tracking ID in format: {prefix}_{timestamp}_{uuid}
+        str: Unique tracking ID in format: {prefix}_{timestamp}_{random hex}
     """
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = str(uuid.uuid4())[:8]  # Use first 8 characters of UUID
+    global _track_id_timestamp
+    unique_id = os.urandom(4).hex()  # Same width as the first 8 characters of a UUID
+    if compact:
+        return f"{prefix}_{time.time_ns():x}_{unique_id}"
+
+    # Format the timestamp at most once per second
+    now = int(time.time())
+    cached_second, timestamp = _track_id_timestamp
+    if cached_second != now:
+        timestamp = time.strftime("%Y%m%d_%H%M%S", time.localtime(now))
+        _track_id_timestamp = (now, timestamp)
     return f"{prefix}_{timestamp}_{unique_id}"